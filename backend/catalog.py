@@ -0,0 +1,258 @@
+"""
+Catálogo local de cartas para Magic Scanner
+Índice em memória carregado do bulk data da Scryfall, usado para validar
+nomes lidos pelo Gemini sem chamadas HTTP
+"""
+
+import difflib
+import json
+import os
+import re
+import unicodedata
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, Optional
+
+import httpx
+
+
+SCRYFALL_BULK_API = "https://api.scryfall.com/bulk-data"
+
+# Campos mantidos por carta (o suficiente para format_card_response)
+CATALOG_FIELDS = (
+    "id", "oracle_id", "name", "lang", "layout", "set", "set_name", "collector_number",
+    "rarity", "released_at", "image_uris", "card_faces", "type_line", "mana_cost", "cmc",
+    "power", "toughness", "colors", "color_identity", "keywords", "oracle_text",
+    "flavor_text", "artist", "legalities", "edhrec_rank", "penny_rank", "scryfall_uri",
+    "tcgplayer_id", "prices", "digital",
+)
+
+# Layouts que não são cartas jogáveis: "art_series" repete o nome da carta
+# nas duas faces ("X // X") e tomaria o lugar da carta real no índice
+SKIPPED_LAYOUTS = {"art_series", "token", "double_faced_token", "emblem"}
+
+# Similaridade mínima (0 a 1) para aceitar um nome na busca aproximada
+FUZZY_CUTOFF = 0.85
+
+
+def normalize_name(name: str) -> str:
+    """
+    Normaliza um nome de carta para busca: sem acentos, minúsculo, espaços únicos
+    e separador de faces padronizado
+    """
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    name = name.replace("’", "'").replace("‘", "'")
+    name = re.sub(r"\s*/+\s*", " // ", name)  # "Fire/Ice" == "Fire // Ice"
+    name = re.sub(r"\s+", " ", name)
+    return name.strip().casefold()
+
+
+def is_catalog_card(card: dict) -> bool:
+    """
+    Cartas mantidas no catálogo: jogáveis e em inglês
+    """
+    return (
+        bool(card.get("name"))
+        and card.get("lang", "en") == "en"
+        and card.get("layout") not in SKIPPED_LAYOUTS
+    )
+
+
+def slim_card(card: dict) -> dict:
+    return {field: card[field] for field in CATALOG_FIELDS if field in card}
+
+
+def iter_json_array(chunks: Iterable[str]) -> Iterator[dict]:
+    """
+    Lê uma lista JSON de objetos em pedaços de texto, um objeto por vez
+
+    O bulk data da Scryfall tem centenas de MB: parsear em streaming mantém
+    na memória só a carta atual, e não o arquivo inteiro.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buffer = ""
+    position = 0
+    exhausted = False
+
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,[":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+
+        if position < len(buffer):
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+                yield item
+                continue
+            except json.JSONDecodeError:
+                if exhausted:
+                    raise
+        elif exhausted:
+            return
+
+        # Objeto incompleto (ou buffer vazio): lê mais um pedaço
+        chunk = next(chunks, None)
+        exhausted = chunk is None
+        buffer = buffer[position:] + (chunk or "")
+        position = 0
+
+
+def iter_bulk_file(path: str, chunk_size: int = 1 << 20) -> Iterator[dict]:
+    with open(path, "r", encoding="utf-8") as handle:
+        yield from iter_json_array(iter(lambda: handle.read(chunk_size), ""))
+
+
+def index_names(card: dict) -> set:
+    """
+    Nomes pelos quais a carta pode ser encontrada: nome combinado ("A // B")
+    e o nome de cada face
+    """
+    names = {normalize_name(card["name"])}
+    for face in card.get("card_faces", []):
+        if face.get("name"):
+            names.add(normalize_name(face["name"]))
+    return names
+
+
+def matching_face_index(card: dict, name: Optional[str]) -> int:
+    """
+    Índice da face cujo nome corresponde ao lido (0 se não houver faces ou match)
+    """
+    if not name:
+        return 0
+    key = normalize_name(name)
+    for index, face in enumerate(card.get("card_faces", [])):
+        if normalize_name(face.get("name", "")) == key:
+            return index
+    return 0
+
+
+class CardCatalog:
+    """
+    Índice nome -> impressões da carta (inclui nomes de cada face)
+    """
+
+    def __init__(self):
+        self.cards_by_name = {}
+        self.names_by_initial = {}
+        self.card_count = 0
+        self.loaded = False
+        self.source = None
+        self.prices_as_of = None
+
+    def add(self, card: dict):
+        """
+        Adiciona uma impressão ao índice
+        """
+        slim = slim_card(card)
+        for name in index_names(card):
+            if name not in self.cards_by_name:
+                self.names_by_initial.setdefault(name[:1], []).append(name)
+            self.cards_by_name.setdefault(name, []).append(slim)
+        self.card_count += 1
+
+    def load(self, path: str) -> int:
+        """
+        Carrega um arquivo de bulk data da Scryfall (lista JSON de cartas),
+        só cartas jogáveis em inglês; o arquivo é lido em streaming
+        """
+        self.cards_by_name = {}
+        self.names_by_initial = {}
+        self.card_count = 0
+        for card in iter_bulk_file(path):
+            if is_catalog_card(card):
+                self.add(card)
+
+        self.loaded = True
+        self.source = path
+        # download_bulk_data grava o updated_at do bulk data como mtime do arquivo
+        self.prices_as_of = datetime.fromtimestamp(os.path.getmtime(path), timezone.utc).isoformat(timespec="seconds")
+        return self.card_count
+
+    def printings(self, name: str) -> list:
+        """
+        Todas as impressões conhecidas para um nome ou nome de face (vazio se não existir)
+        """
+        if not name:
+            return []
+        return self.cards_by_name.get(normalize_name(name), [])
+
+    def lookup(self, name: str) -> Optional[dict]:
+        """
+        Busca exata (normalizada) por nome; retorna uma impressão ou None
+        """
+        printings = self.printings(name)
+        return printings[0] if printings else None
+
+    def closest_name(self, name: str, cutoff: float = FUZZY_CUTOFF) -> Optional[str]:
+        """
+        Busca aproximada (erros de digitação) entre os nomes com a mesma inicial;
+        retorna o nome normalizado mais parecido ou None
+        """
+        key = normalize_name(name or "")
+        if not key:
+            return None
+        matches = difflib.get_close_matches(key, self.names_by_initial.get(key[:1], []), n=1, cutoff=cutoff)
+        return matches[0] if matches else None
+
+    def info(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "source": self.source,
+            "names": len(self.cards_by_name),
+            "cards": self.card_count,
+            "prices_as_of": self.prices_as_of,
+        }
+
+
+def download_bulk_data(dest: str, bulk_type: str = "default_cards") -> str:
+    """
+    Baixa o bulk data da Scryfall para `dest` (uso offline, fora do request)
+
+    Filtra e reduz as cartas durante o download (só CATALOG_FIELDS das cartas
+    jogáveis em inglês), então o arquivo salvo é uma fração do original e o
+    servidor carrega pouco na inicialização.
+    """
+    with httpx.Client(timeout=60, follow_redirects=True) as client:
+        response = client.get(SCRYFALL_BULK_API)
+        response.raise_for_status()
+        entries = {entry["type"]: entry for entry in response.json().get("data", [])}
+        if bulk_type not in entries:
+            raise ValueError(f"Tipo de bulk data desconhecido: {bulk_type}")
+
+        os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+        partial = f"{dest}.partial"
+        with client.stream("GET", entries[bulk_type]["download_uri"]) as stream:
+            stream.raise_for_status()
+            with open(partial, "w", encoding="utf-8") as handle:
+                handle.write("[")
+                written = 0
+                for card in iter_json_array(stream.iter_text()):
+                    if not is_catalog_card(card):
+                        continue
+                    handle.write(",\n" if written else "\n")
+                    json.dump(slim_card(card), handle, ensure_ascii=False)
+                    written += 1
+                handle.write("\n]\n")
+        # Troca atômica: um servidor recarregando nunca lê um arquivo pela metade
+        os.replace(partial, dest)
+
+    # Data dos preços = geração do bulk data na Scryfall, guardada como mtime
+    updated_at = entries[bulk_type].get("updated_at")
+    if updated_at:
+        timestamp = datetime.fromisoformat(updated_at).timestamp()
+        os.utime(dest, (timestamp, timestamp))
+    return dest
+
+
+if __name__ == "__main__":
+    import sys
+
+    target = sys.argv[1] if len(sys.argv) > 1 else os.getenv("CATALOG_PATH", "data/cards.json")
+    kind = sys.argv[2] if len(sys.argv) > 2 else "default_cards"
+    print(f"📥 Baixando bulk data '{kind}' da Scryfall para {target}...")
+    download_bulk_data(target, kind)
+    catalog = CardCatalog()
+    print(f"✅ {catalog.load(target)} cartas indexadas")
@@ -0,0 +1,115 @@
+"""
+Leitura de listas de deck para Magic Scanner
+Interpreta listas coladas nos formatos MTGO e Arena (quantidade + nome, com
+coleção e número opcionais) linha a linha, sem montar a lista inteira
+"""
+
+import re
+from typing import Iterable, Iterator, Optional
+
+
+# Cabeçalhos de seção (Arena, Moxfield, MTGO) -> seção normalizada.
+# `None` marca seções sem cartas (ex.: "About" do Arena).
+SECTION_HEADERS = {
+    "deck": "main",
+    "main": "main",
+    "mainboard": "main",
+    "main deck": "main",
+    "sideboard": "sideboard",
+    "sb": "sideboard",
+    "commander": "commander",
+    "commanders": "commander",
+    "companion": "companion",
+    "maybeboard": "maybeboard",
+    "considering": "maybeboard",
+    "about": None,
+}
+
+# "4 Lightning Bolt", "4x Lightning Bolt", "SB: 2 Duress",
+# "1 Sol Ring (C21) 263", "1 Sol Ring (C21) 263 *F*"
+LINE_PATTERN = re.compile(
+    r"^(?P<sideboard>SB:\s*)?"
+    r"(?:(?P<quantity>\d{1,3})\s*[xX]?\s+)?"
+    r"(?P<name>.+?)"
+    r"(?:\s+\((?P<set>[A-Za-z0-9]{2,6})\)(?:\s+(?P<number>[A-Za-z0-9★-]+))?)?"
+    r"(?P<markers>(?:\s+\*[A-Za-z]+\*)*)\s*$"
+)
+
+# Cabeçalhos de categoria com contagem (Moxfield/Archidekt): "Creatures (20)"
+COUNTED_HEADER_PATTERN = re.compile(r"^(?P<title>[A-Za-z][A-Za-z /&-]*?)\s*\(\d+\)$")
+
+# Marcadores de acabamento do Moxfield -> chave de preço da Scryfall
+FINISH_MARKERS = {"F": "foil", "E": "etched"}
+
+
+def section_header(line: str) -> tuple:
+    """
+    Retorna (é cabeçalho, seção) para uma linha
+    """
+    key = line.strip().rstrip(":").strip().casefold()
+    if key in SECTION_HEADERS:
+        return True, SECTION_HEADERS[key]
+
+    # Categoria com contagem e sem quantidade: seção conhecida ou tipo de carta (deck principal)
+    counted = COUNTED_HEADER_PATTERN.match(line.strip())
+    if counted:
+        return True, SECTION_HEADERS.get(counted.group("title").strip().casefold(), "main")
+    return False, None
+
+
+def parse_deck_line(line: str) -> Optional[dict]:
+    """
+    Interpreta uma linha de carta; None se a linha não tiver nome
+    """
+    match = LINE_PATTERN.match(line.strip())
+    if not match or not match.group("name").strip():
+        return None
+    markers = re.findall(r"\*([A-Za-z]+)\*", match.group("markers"))
+    finish = next((FINISH_MARKERS[marker.upper()] for marker in markers if marker.upper() in FINISH_MARKERS), "nonfoil")
+    return {
+        "quantity": int(match.group("quantity") or 1),
+        "name": match.group("name").strip(),
+        "set_code": match.group("set"),
+        "collector_number": match.group("number"),
+        "finish": finish,
+        "sideboard": bool(match.group("sideboard")),
+    }
+
+
+def parse_deck_list(lines: Iterable[str]) -> Iterator[dict]:
+    """
+    Gera uma entrada por linha de carta, com a seção e o número da linha
+
+    Ignora linhas vazias, comentários (`//`, `#`) e a seção "About" do Arena.
+    Sem nenhum cabeçalho, a primeira linha vazia depois das cartas separa o
+    deck principal do sideboard (formato MTGO).
+    """
+    section = "main"
+    saw_header = False
+    saw_cards = False
+
+    for line_number, raw in enumerate(lines, start=1):
+        line = raw.strip()
+        if not line:
+            if not saw_header and saw_cards and section == "main":
+                section = "sideboard"
+            continue
+        if line.startswith(("//", "#")):
+            continue
+
+        is_header, header_section = section_header(line)
+        if is_header:
+            section = header_section
+            saw_header = True
+            continue
+        if section is None:
+            continue
+
+        entry = parse_deck_line(line)
+        if entry is None:
+            continue
+        saw_cards = True
+        entry["section"] = "sideboard" if entry.pop("sideboard") else section
+        entry["line_number"] = line_number
+        entry["line"] = line
+        yield entry
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Harness de avaliação do Magic Scanner
+Reexecuta um corpus rotulado de imagens pelo pipeline completo (process_scan)
+e compara acurácia e latência com um baseline salvo.
+
+Modos:
+- replay (padrão): usa as respostas gravadas do Gemini; sem rede, determinístico
+- live: chama o Gemini de verdade (requer GEMINI_API_KEY)
+- record: igual ao live, mas grava as respostas no corpus para replays futuros
+
+Uso:
+    python evaluate.py                       # replay + diff com o baseline
+    python evaluate.py --mode record         # grava respostas do modelo
+    python evaluate.py --update-baseline     # salva as métricas atuais como baseline
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import mimetypes
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval", "corpus.json")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "eval", "baseline.json")
+
+# Tolerâncias para considerar regressão
+ACCURACY_TOLERANCE = 0.0
+LATENCY_TOLERANCE = 0.20  # +20% na p50 de um estágio...
+LATENCY_MIN_DELTA_MS = 25.0  # ...e pelo menos 25ms, para ignorar ruído no replay
+
+ACCURACY_METRICS = ("name_accuracy", "printing_accuracy", "catalog_hit_rate")
+STAGES = ("preprocess", "recognition", "lookup", "total")
+
+
+def load_pipeline(mode: str):
+    """
+    Importa o main.py; no replay a chave do Gemini não é usada
+    """
+    if mode == "replay":
+        os.environ.setdefault("GEMINI_API_KEY", "offline-replay")
+    elif not os.getenv("GEMINI_API_KEY"):
+        raise SystemExit("❌ GEMINI_API_KEY é necessária nos modos live/record")
+
+    import main
+    return main
+
+
+class OfflineClient:
+    """
+    Substitui o httpx.AsyncClient no replay: toda chamada de rede falha
+    """
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def get(self, url, *args, **kwargs):
+        import httpx
+        raise httpx.ConnectError(f"Rede desabilitada no replay: {url}")
+
+
+class RecordedModel:
+    """
+    Modelo Gemini de mentira (replay) ou proxy que grava respostas (record)
+    """
+
+    def __init__(self, pipeline, live_model=None):
+        self.pipeline = pipeline
+        self.live_model = live_model
+        self.responses = {}
+
+    def tier_for_prompt(self, prompt) -> str:
+        for tier, config in self.pipeline.SCAN_TIERS.items():
+            if prompt == config["prompt"]:
+                return tier
+        return "fallback"
+
+    def generate_content(self, parts, *args, **kwargs):
+        prompt = parts[0] if isinstance(parts, list) else parts
+        tier = self.tier_for_prompt(prompt)
+
+        if self.live_model is not None:
+            response = self.live_model.generate_content(parts, *args, **kwargs)
+            self.responses[tier] = response.text
+            return response
+
+        if tier not in self.responses:
+            raise RuntimeError(f"Sem resposta gravada para o tier '{tier}'")
+        return SimpleNamespace(text=self.responses[tier])
+
+
+def names_match(expected: str, result: dict) -> bool:
+    """
+    Nome correto se bater com a carta ou com alguma de suas faces
+    """
+    from catalog import normalize_name
+
+    card = result.get("card_data") or {}
+    names = {card.get("name", "")} | {face.get("name", "") for face in card.get("faces", [])}
+    if not card:
+        names = {result.get("card_name") or ""}
+    return normalize_name(expected) in {normalize_name(name) for name in names if name}
+
+
+def printing_matches(expected: dict, result: dict) -> bool:
+    from printings import normalize_collector_number
+
+    card = result.get("card_data") or {}
+    return (
+        card.get("setCode", "").lower() == expected["set"].lower()
+        and normalize_collector_number(card.get("collectorNumber")) == normalize_collector_number(expected["collector_number"])
+    )
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return round(ordered[index], 1)
+
+
+async def run_corpus(pipeline, corpus: dict, corpus_dir: str, mode: str, scan_mode: str, verbose: bool) -> tuple:
+    """
+    Roda cada amostra pelo pipeline e retorna (métricas, resultados por amostra)
+    """
+    live_model = pipeline.model if mode in ("live", "record") else None
+    recorded = RecordedModel(pipeline, live_model)
+    pipeline.model = recorded
+
+    samples = []
+    skipped = []
+    for sample in corpus["samples"]:
+        if mode == "replay" and not sample.get("responses"):
+            skipped.append(sample["id"])  # Sem respostas gravadas: não há o que reexecutar
+            continue
+
+        image_path = os.path.join(corpus_dir, sample["image"])
+        with open(image_path, "rb") as handle:
+            image_data = handle.read()
+        content_type = mimetypes.guess_type(image_path)[0] or "image/jpeg"
+
+        recorded.responses = dict(sample.get("responses", {})) if mode == "replay" else {}
+        output = io.StringIO()
+        started = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(sys.stdout if verbose else output):
+                result = await pipeline.process_scan(image_data, content_type, client_id="evaluate", mode=scan_mode)
+            error = None
+        except Exception as e:
+            result = {}
+            error = getattr(e, "detail", None) or f"{type(e).__name__}: {e}"
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        if mode == "record" and recorded.responses:
+            sample["responses"] = dict(recorded.responses)
+
+        expected = sample["expected"]
+        has_printing_label = "set" in expected and "collector_number" in expected
+        info = result.get("processing_info", {})
+        samples.append({
+            "id": sample["id"],
+            "error": error,
+            "name_ok": bool(result) and names_match(expected["name"], result),
+            "printing_ok": bool(result) and has_printing_label and printing_matches(expected, result),
+            "has_printing_label": has_printing_label,
+            "catalog_hit": info.get("catalog_validated", False),
+            "tier": info.get("tier"),
+            "stage_ms": info.get("stage_ms", {"total": elapsed_ms}),
+            "card": (result.get("card_data") or {}).get("id") or result.get("card_name"),
+        })
+
+    metrics = summarize(samples)
+    metrics["skipped"] = len(skipped)
+    if skipped:
+        print(f"⚠️  {len(skipped)} amostra(s) sem respostas gravadas ignoradas: {', '.join(skipped)}")
+    return metrics, samples
+
+
+def summarize(samples: list) -> dict:
+    total = len(samples) or 1
+    labeled = [sample for sample in samples if sample["has_printing_label"]]
+
+    metrics = {
+        "samples": len(samples),
+        "errors": sum(1 for sample in samples if sample["error"]),
+        "name_accuracy": round(sum(sample["name_ok"] for sample in samples) / total, 4),
+        "printing_accuracy": round(sum(sample["printing_ok"] for sample in labeled) / (len(labeled) or 1), 4),
+        "catalog_hit_rate": round(sum(sample["catalog_hit"] for sample in samples) / total, 4),
+        "tiers": {},
+        "latency_ms": {},
+    }
+    for sample in samples:
+        if sample["tier"]:
+            metrics["tiers"][sample["tier"]] = metrics["tiers"].get(sample["tier"], 0) + 1
+    for stage in STAGES:
+        values = [sample["stage_ms"][stage] for sample in samples if stage in sample["stage_ms"]]
+        metrics["latency_ms"][stage] = {
+            "p50": percentile(values, 0.5),
+            "p95": percentile(values, 0.95),
+            "mean": round(statistics.fmean(values), 1) if values else 0.0,
+        }
+    return metrics
+
+
+def diff_against_baseline(metrics: dict, baseline: dict) -> list:
+    """
+    Lista de regressões (vazia se tudo estiver igual ou melhor)
+    """
+    regressions = []
+    print("\n📊 Métrica                   baseline     atual      delta")
+    before, after = baseline.get("errors", 0), metrics["errors"]
+    flag = ""
+    if after > before:
+        flag = "  ❌"
+        regressions.append("errors")
+    print(f"   {'errors':<24}{before:>9d}{after:>10d}{after - before:>+10d}{flag}")
+
+    for metric in ACCURACY_METRICS:
+        before, after = baseline.get(metric, 0.0), metrics[metric]
+        flag = ""
+        if after < before - ACCURACY_TOLERANCE:
+            flag = "  ❌"
+            regressions.append(metric)
+        print(f"   {metric:<24}{before:>9.3f}{after:>10.3f}{after - before:>+10.3f}{flag}")
+
+    for stage in STAGES:
+        before = baseline.get("latency_ms", {}).get(stage, {}).get("p50", 0.0)
+        after = metrics["latency_ms"][stage]["p50"]
+        flag = ""
+        if before and after > before * (1 + LATENCY_TOLERANCE) and after - before > LATENCY_MIN_DELTA_MS:
+            flag = "  ⚠️"
+            regressions.append(f"latency.{stage}")
+        print(f"   {'p50 ' + stage + ' (ms)':<24}{before:>9.1f}{after:>10.1f}{after - before:>+10.1f}{flag}")
+    return regressions
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Avaliação de reconhecimento e latência do Magic Scanner")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--mode", choices=("replay", "live", "record"), default="replay")
+    parser.add_argument("--scan-mode", choices=("auto", "fast", "accurate"), default="auto")
+    parser.add_argument("--catalog", default=os.getenv("CATALOG_PATH", "data/cards.json"))
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    pipeline = load_pipeline(args.mode)
+    if args.mode == "replay":
+        pipeline.httpx.AsyncClient = OfflineClient
+
+    if os.path.exists(args.catalog):
+        pipeline.card_catalog.load(args.catalog)
+        if os.path.exists(pipeline.SYMBOL_INDEX_PATH):
+            pipeline.printing_resolver.load_symbol_index(pipeline.SYMBOL_INDEX_PATH)
+    else:
+        print(f"⚠️  Catálogo não encontrado em {args.catalog}; no replay nenhum nome será validado")
+
+    with open(args.corpus, "r", encoding="utf-8") as handle:
+        corpus = json.load(handle)
+
+    corpus_dir = os.path.dirname(os.path.abspath(args.corpus))
+    metrics, samples = asyncio.run(
+        run_corpus(pipeline, corpus, corpus_dir, args.mode, args.scan_mode, args.verbose)
+    )
+
+    for sample in samples:
+        status = "✅" if sample["name_ok"] else "❌"
+        detail = sample["error"] or sample["card"]
+        print(f"{status} {sample['id']:<32} {sample['tier'] or '-':<9} {sample['stage_ms'].get('total', 0):>8.1f}ms  {detail}")
+
+    if args.mode == "record":
+        with open(args.corpus, "w", encoding="utf-8") as handle:
+            json.dump(corpus, handle, ensure_ascii=False, indent=2)
+        print(f"💾 Respostas gravadas em {args.corpus}")
+
+    if not samples:
+        print("❌ Nenhuma amostra executada; no replay rode antes `python evaluate.py --mode record`")
+        return 1
+
+    if args.update_baseline:
+        if metrics["errors"]:
+            print(f"❌ Baseline não salvo: {metrics['errors']} amostra(s) com erro")
+            return 1
+        with open(args.baseline, "w", encoding="utf-8") as handle:
+            json.dump(metrics, handle, indent=2)
+        print(f"💾 Baseline atualizado em {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(json.dumps(metrics, indent=2))
+        print("ℹ️  Sem baseline salvo; rode com --update-baseline para criar")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    regressions = diff_against_baseline(metrics, baseline)
+    if regressions:
+        print(f"\n❌ Regressões: {', '.join(regressions)}")
+        return 1
+    print("\n✅ Sem regressões")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
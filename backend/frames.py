@@ -0,0 +1,153 @@
+"""
+Seleção de frames para Magic Scanner
+Métricas baratas (NumPy) de nitidez e presença de carta para escolher o
+melhor frame de uma rajada ou de um stream da câmera
+"""
+
+import io
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+
+# Tamanho de análise: as métricas rodam numa versão reduzida em tons de cinza
+ANALYSIS_SIZE = 256
+
+# Proporção de uma carta de Magic (63 x 88 mm)
+CARD_ASPECT = 63 / 88
+
+# Abaixo disso consideramos que não há carta no quadro
+MIN_PRESENCE = 0.35
+
+# Diferença média (0-255) abaixo da qual dois frames mostram a mesma cena
+SAME_SCENE_THRESHOLD = 12.0
+
+
+def load_frame(frame_data: bytes) -> tuple:
+    """
+    Decodifica o frame e devolve (tamanho original, matriz em cinza reduzida)
+
+    Para JPEG usa o modo draft do Pillow, que já decodifica reduzido.
+    """
+    image = Image.open(io.BytesIO(frame_data))
+    size = image.size
+    image.draft("L", (ANALYSIS_SIZE, ANALYSIS_SIZE))
+    image = image.convert("L")
+    image.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE))
+    return size, np.asarray(image, dtype=np.float32)
+
+
+def laplacian_variance(gray: np.ndarray) -> float:
+    """
+    Variância do Laplaciano (4 vizinhos): quanto maior, mais nítido
+    """
+    laplacian = (
+        gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+        - 4 * gray[1:-1, 1:-1]
+    )
+    return float(laplacian.var())
+
+
+def _edge_extent(projection: np.ndarray) -> int:
+    """
+    Extensão das bordas numa projeção, ignorando 2% de ruído em cada ponta
+    """
+    cumulative = np.cumsum(projection) / projection.sum()
+    start = int(np.searchsorted(cumulative, 0.02))
+    end = int(np.searchsorted(cumulative, 0.98))
+    return end - start + 1
+
+
+def _card_box(gray: np.ndarray) -> Optional[tuple]:
+    """
+    (largura, altura) da caixa que envolve as bordas fortes; None sem bordas
+    """
+    dx = np.abs(np.diff(gray, axis=1))[:-1, :]
+    dy = np.abs(np.diff(gray, axis=0))[:, :-1]
+    magnitude = dx + dy
+    edges = magnitude > max(magnitude.mean() + 2 * magnitude.std(), 20.0)
+    if not edges.any():
+        return None
+    return _edge_extent(edges.sum(axis=0)), _edge_extent(edges.sum(axis=1)), edges.size
+
+
+def _aspect_score(width: int, height: int) -> float:
+    aspect = min(width, height) / max(width, height)
+    return float(np.exp(-abs(np.log(aspect / CARD_ASPECT)) * 4))
+
+
+def card_presence(gray: np.ndarray) -> float:
+    """
+    Heurística de presença de carta (0 a 1): caixa que envolve as bordas fortes
+    deve ocupar boa parte do quadro e ter a proporção de uma carta
+    """
+    box = _card_box(gray)
+    if box is None:
+        return 0.0
+    width, height, area = box
+    coverage_score = min((width * height) / area / 0.4, 1.0)
+    return round(_aspect_score(width, height) * coverage_score, 4)
+
+
+def card_fill(image: Image.Image) -> float:
+    """
+    Quanto a carta preenche a imagem (0 a 1), já penalizando a proporção
+
+    Perto de 1 só quando a foto é a carta recortada, o que permite usar
+    regiões fixas da carta (ex.: símbolo da coleção).
+    """
+    gray = image.convert("L")
+    gray.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE))
+    box = _card_box(np.asarray(gray, dtype=np.float32))
+    if box is None:
+        return 0.0
+    width, height, area = box
+    return round(_aspect_score(width, height) * min((width * height) / area, 1.0), 4)
+
+
+def scene_signature(gray: np.ndarray) -> np.ndarray:
+    """
+    Miniatura 32x32 usada para detectar se a cena mudou
+    """
+    image = Image.fromarray(gray.astype(np.uint8)).resize((32, 32), Image.Resampling.BILINEAR)
+    return np.asarray(image, dtype=np.float32)
+
+
+def same_scene(a: Optional[np.ndarray], b: Optional[np.ndarray]) -> bool:
+    if a is None or b is None:
+        return False
+    return float(np.abs(a - b).mean()) < SAME_SCENE_THRESHOLD
+
+
+def score_frame(frame_data: bytes) -> dict:
+    """
+    Métricas de um frame: nitidez, presença de carta e assinatura da cena
+    """
+    size, gray = load_frame(frame_data)
+    return {
+        "size": size,
+        "sharpness": round(laplacian_variance(gray), 2),
+        "presence": card_presence(gray),
+        "signature": scene_signature(gray),
+    }
+
+
+def rank_frames(metrics: list) -> list:
+    """
+    Ordena os índices dos frames do melhor para o pior
+
+    A nitidez é normalizada pelo máximo da rajada; frames sem carta perdem metade da nota.
+    """
+    top_sharpness = max((frame["sharpness"] for frame in metrics), default=0.0) or 1.0
+    for frame in metrics:
+        presence = frame["presence"] if frame["presence"] >= MIN_PRESENCE else 0.0
+        frame["score"] = round((frame["sharpness"] / top_sharpness) * (0.5 + 0.5 * presence), 4)
+    return sorted(range(len(metrics)), key=lambda index: metrics[index]["score"], reverse=True)
+
+
+def public_metrics(frame: dict) -> dict:
+    """
+    Métricas serializáveis (sem a assinatura) para o processing_info
+    """
+    return {key: value for key, value in frame.items() if key != "signature"}
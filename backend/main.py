@@ -4,16 +4,34 @@ Orquestra chamadas para Google Gemini Pro, Scryfall e APIs de preços
 """
 
 import os
+import time
+import random
+import secrets
 import asyncio
-from typing import Optional
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+from fastapi import FastAPI, File, Form, Request, UploadFile, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.requests import HTTPConnection
 from dotenv import load_dotenv
 import httpx
 import google.generativeai as genai
 from PIL import Image
 import io
 
+from catalog import CardCatalog, matching_face_index, normalize_name
+from decklist import parse_deck_list
+from frames import MIN_PRESENCE, card_fill, public_metrics, rank_frames, same_scene, score_frame
+from profiling import ProfileStore, ScanProfiler, current_trace, record_upstream, update_trace
+from printings import PrintingResolver, extract_printing_hints, symbol_hash
+from scheduler import (
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    RecognitionScheduler,
+    SchedulerOverloaded,
+)
+
 # Carrega variáveis de ambiente
 load_dotenv()
 
@@ -35,7 +53,7 @@ if not gemini_api_key:
 
 genai.configure(api_key=gemini_api_key)
 
-# Configuração do modelo para velocidade otimizada
+# Configuração do modelo para velocidade otimizada (tier "accurate")
 generation_config = {
     "temperature": 0.1,
     "top_p": 0.8,
@@ -43,6 +61,9 @@ generation_config = {
     "max_output_tokens": 200,  # Limita resposta para ser mais rápida
 }
 
+# Tier "fast": resposta mais curta = mais rápida
+fast_generation_config = {**generation_config, "max_output_tokens": 150}
+
 safety_settings = [
     {
         "category": "HARM_CATEGORY_HARASSMENT",
@@ -72,22 +93,151 @@ model = genai.GenerativeModel(
 # Base URL da Scryfall API
 SCRYFALL_API = "https://api.scryfall.com"
 
+# Parâmetros de captura preferidos, publicados em /api/scan/config.
+# Uploads que já respeitam esses limites pulam o redimensionamento no servidor.
+CAPTURE_MAX_DIMENSION = 768
+CAPTURE_FORMATS = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+CAPTURE_PREFERRED_FORMAT = "image/webp"
+CAPTURE_QUALITY = 85
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+
+# Banda de upload estimada do cliente (kbit/s), usada para estimar o tempo economizado
+UPLOAD_BANDWIDTH_KBPS = float(os.getenv("UPLOAD_BANDWIDTH_KBPS", "4000"))
+
+# Catálogo local (bulk data da Scryfall) usado para validar nomes sem HTTP
+CATALOG_PATH = os.getenv("CATALOG_PATH", "data/cards.json")
+card_catalog = CardCatalog()
+
+# Índice local de símbolos de coleção (desambiguação de impressões)
+SYMBOL_INDEX_PATH = os.getenv("SYMBOL_INDEX_PATH", "data/set_symbols.json")
+SYMBOL_MIN_FILL = 0.6  # Quanto a carta precisa preencher a foto para comparar o símbolo
+printing_resolver = PrintingResolver()
+
+# Modo padrão do pipeline: "auto" (fast, escala para accurate), "fast" ou "accurate"
+SCAN_MODES = ("auto", "fast", "accurate")
+SCAN_DEFAULT_MODE = os.getenv("SCAN_DEFAULT_MODE", "auto")
+
+# Timeout de cada chamada ao Gemini (segundos)
+GEMINI_TIMEOUT_SECONDS = 90
+
+# Escalonador na frente da cota do Gemini: prioridade interativa vs. lote,
+# rodízio justo entre clientes e 429 com Retry-After quando a fila enche
+recognition_scheduler = RecognitionScheduler(
+    concurrency=int(os.getenv("RECOGNITION_CONCURRENCY", "4")),
+    max_queue_depth={
+        PRIORITY_INTERACTIVE: int(os.getenv("RECOGNITION_MAX_INTERACTIVE_QUEUE", "32")),
+        PRIORITY_BATCH: int(os.getenv("RECOGNITION_MAX_BATCH_QUEUE", "256")),
+    },
+    max_wait_seconds=float(os.getenv("RECOGNITION_MAX_WAIT_SECONDS", "60")),
+)
+
+# Threads das chamadas ao Gemini, do mesmo tamanho da concorrência do escalonador.
+# Uma chamada que estoura o timeout continua rodando na thread (não dá para
+# cancelá-la) mas segura o worker: a próxima espera no pool em vez de passar
+# do limite de chamadas simultâneas.
+gemini_executor = ThreadPoolExecutor(
+    max_workers=recognition_scheduler.concurrency,
+    thread_name_prefix="gemini",
+)
+BATCH_MAX_FILES = 50
+
+# Ids de cliente (X-Client-Id) aceitos por IP e por quanto tempo ficam ativos
+MAX_CLIENT_IDS_PER_IP = int(os.getenv("MAX_CLIENT_IDS_PER_IP", "8"))
+CLIENT_ID_TTL_SECONDS = 600
+client_ids_by_ip = {}
+
+# Rajada / stream: só o melhor frame vai para o reconhecimento
+BURST_MAX_FRAMES = 10
+STREAM_WINDOW = int(os.getenv("STREAM_WINDOW", "4"))  # frames avaliados por tentativa no stream
+
+# Listas de deck (/api/lookup): resolvidas só pelo catálogo local
+DECK_LIST_MAX_BYTES = 256 * 1024
+DECK_LIST_MAX_LINES = 1000
+
+# Profiling: perfil por requisição (X-Profile + X-Debug-Token ou amostragem) e
+# captura dos scans lentos num ring buffer em disco, visível em /api/debug/profiles
+DEBUG_TOKEN = os.getenv("DEBUG_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+SLOW_SCAN_MS = float(os.getenv("SLOW_SCAN_MS", "10000"))
+PROFILE_SLOW_SCANS = os.getenv("PROFILE_SLOW_SCANS", "1") == "1"
+profile_store = ProfileStore(
+    os.getenv("PROFILE_DIR", "data/profiles"),
+    capacity=int(os.getenv("PROFILE_RING_SIZE", "50")),
+)
+
+# Média móvel do tempo de pré-processamento no caminho lento (redimensionamento)
+preprocess_stats = {"slow_path_ms": None}
+
+
+
+def is_capture_conformant(image: Image.Image) -> bool:
+    """
+    Verifica se a imagem já está no formato e tamanho publicados em /api/scan/config
+    """
+    return image.format in CAPTURE_FORMATS and max(image.size) <= CAPTURE_MAX_DIMENSION
+
+
+def estimate_latency_saved(
+    upload_bytes: int,
+    original_size: Optional[int],
+    fast_path: bool,
+    preprocess_ms: float,
+) -> dict:
+    """
+    Estima a latência economizada quando o cliente já envia a imagem reduzida
+    """
+    bytes_saved = max(original_size - upload_bytes, 0) if original_size else 0
+    upload_ms_saved = bytes_saved * 8 / UPLOAD_BANDWIDTH_KBPS if bytes_saved else 0.0
+
+    resize_ms_saved = 0.0
+    slow_path_ms = preprocess_stats["slow_path_ms"]
+    if fast_path and slow_path_ms is not None:
+        resize_ms_saved = max(slow_path_ms - preprocess_ms, 0.0)
+
+    return {
+        "fast_path": fast_path,
+        "preprocess_ms": round(preprocess_ms, 1),
+        "original_size": original_size,
+        "bytes_saved": bytes_saved,
+        "estimated_upload_ms_saved": round(upload_ms_saved, 1),
+        "estimated_resize_ms_saved": round(resize_ms_saved, 1),
+        "estimated_total_ms_saved": round(upload_ms_saved + resize_ms_saved, 1),
+    }
 
 
 # Função melhorada: pré-processar e descrever a imagem
-def preprocess_image(image_data: bytes) -> Image.Image:
+def preprocess_image(image_data: bytes, stats: Optional[dict] = None) -> Image.Image:
     """
     Pré-processa a imagem para melhorar a qualidade do reconhecimento
+
+    Se `stats` for informado, é preenchido com o caminho usado (rápido ou não)
+    e o tempo gasto, para compor o `processing_info` do scan.
     """
+    started = time.perf_counter()
     try:
         image = Image.open(io.BytesIO(image_data))
+        if stats is not None:
+            stats["original_dimensions"] = image.size
+
+        # Caminho rápido: cliente já enviou WebP/JPEG no tamanho preferido
+        if is_capture_conformant(image):
+            # Image.open é preguiçoso: decodifica aqui para medir o tempo real
+            # e recusar uploads truncados como 400
+            image.load()
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            if stats is not None:
+                stats["processed_dimensions"] = image.size
+                stats["fast_path"] = True
+                stats["preprocess_ms"] = (time.perf_counter() - started) * 1000
+            return image
         
         # Converte para RGB se necessário
         if image.mode != 'RGB':
             image = image.convert('RGB')
         
         # Redimensiona para tamanho otimizado (mais agressivo para melhor performance)
-        target_size = 768  # Menor para processar mais rápido
+        target_size = CAPTURE_MAX_DIMENSION  # Menor para processar mais rápido
         if max(image.size) > target_size:
             ratio = target_size / max(image.size)
             new_size = (int(image.width * ratio), int(image.height * ratio))
@@ -97,21 +247,59 @@ def preprocess_image(image_data: bytes) -> Image.Image:
         # Aplica compressão adicional se necessário
         if len(image_data) > 2 * 1024 * 1024:  # > 2MB
             output = io.BytesIO()
-            image.save(output, format='JPEG', quality=85, optimize=True)
+            image.save(output, format='JPEG', quality=CAPTURE_QUALITY, optimize=True)
             compressed_data = output.getvalue()
             print(f"🗜️ Imagem comprimida de {len(image_data)} para {len(compressed_data)} bytes")
             image = Image.open(io.BytesIO(compressed_data))
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        previous = preprocess_stats["slow_path_ms"]
+        preprocess_stats["slow_path_ms"] = elapsed_ms if previous is None else 0.8 * previous + 0.2 * elapsed_ms
+        if stats is not None:
+            stats["processed_dimensions"] = image.size
+            stats["fast_path"] = False
+            stats["preprocess_ms"] = elapsed_ms
         
         return image
     except Exception as e:
         raise ValueError(f"Erro ao processar imagem: {str(e)}")
 
 
+def extract_card_name(text: str) -> Optional[str]:
+    """
+    Extrai nome da carta de forma simples (tier "fast")
+    """
+    import re
+    
+    # Padrões simples para extrair nome
+    patterns = [
+        r'NOME:\s*([^\n|]+)',  # "NOME: x | SET: y | NÚMERO: z"
+        r'Card:\s*([^\n|]+)',
+        r'^([A-Za-z][A-Za-z0-9\s\-\']+)',  # Primeira linha que parece nome
+    ]
+    
+    for pattern in patterns:
+        match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+        if match:
+            name = match.group(1).strip()
+            if len(name) > 2 and len(name) < 50:
+                return name
+    
+    return None
+
+
 def extract_card_name_advanced(description: str) -> str:
     """
     Extrai o nome da carta usando múltiplas estratégias
     """
     import re
+
+    # Estratégia 0: campo "NOME:" do próprio prompt (qualquer caixa, com ou sem markdown)
+    match = re.search(r"^[\s*_#-]*nome[\s*_]*:[\s*_]*(.+?)[\s*_]*$", description, re.IGNORECASE | re.MULTILINE)
+    if match:
+        name = match.group(1).strip().strip("[]\"'")
+        if 2 < len(name) < 80:
+            return name
     
     # Estratégia 1: Procura por padrões comuns
     patterns = [
@@ -143,42 +331,101 @@ def extract_card_name_advanced(description: str) -> str:
     return None
 
 
-async def describe_card_with_gemini(image_data: bytes) -> dict:
+# Tiers do pipeline: "fast" roda primeiro; "accurate" só quando o nome não
+# passa na validação do catálogo (ou quando pedido explicitamente)
+SCAN_TIERS = {
+    "fast": {
+        "max_dimension": 512,  # Bem pequeno para ser rápido
+        "prompt": (
+            "Carta de Magic: The Gathering. Responda em uma linha: "
+            "NOME: <nome> | SET: <código da coleção, se visível> | NÚMERO: <número de colecionador, se visível>"
+        ),
+        "generation_config": fast_generation_config,
+        "extract": extract_card_name,
+    },
+    "accurate": {
+        "max_dimension": CAPTURE_MAX_DIMENSION,
+        "prompt": (
+            "Esta é uma carta de Magic: The Gathering. Identifique rapidamente:\n\n"
+            "NOME: [nome da carta - MAIS IMPORTANTE]\n"
+            "DESCRIÇÃO: [breve descrição da carta]\n"
+            "SET: [código da coleção no canto inferior esquerdo, se visível]\n"
+            "NÚMERO: [número de colecionador, se visível]\n\n"
+            "Foque no nome da carta. Se não conseguir ler o nome completo, "
+            "tente ler pelo menos parte dele. Seja rápido e direto."
+        ),
+        "generation_config": generation_config,
+        "extract": extract_card_name_advanced,
+    },
+}
+
+# Contadores por tier (qual tier respondeu, escaladas, latência média)
+tier_stats = {
+    "scans": 0,
+    "answered_by": {tier: 0 for tier in SCAN_TIERS},
+    "escalations": 0,
+    "unresolved": 0,
+    "avg_ms": {tier: None for tier in SCAN_TIERS},
+}
+
+
+def resize_for_tier(image: Image.Image, max_dimension: int) -> Image.Image:
+    """
+    Reduz a imagem já pré-processada para o tamanho do tier
+    """
+    if max(image.size) <= max_dimension:
+        return image
+    ratio = max_dimension / max(image.size)
+    new_size = (int(image.width * ratio), int(image.height * ratio))
+    return image.resize(new_size, Image.Resampling.LANCZOS)
+
+
+async def call_gemini(func, *args):
+    """
+    Roda uma chamada síncrona ao Gemini no pool dedicado, com GEMINI_TIMEOUT_SECONDS
+    (propaga o contexto para o trace do scan)
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await asyncio.wait_for(
+        loop.run_in_executor(gemini_executor, context.run, func, *args),
+        timeout=GEMINI_TIMEOUT_SECONDS
+    )
+
+
+async def describe_card_with_gemini(image: Image.Image, tier: str = "accurate") -> dict:
     """
     Usa Google Gemini Pro Vision para descrever a imagem e tentar identificar o nome da carta
     """
     try:
-        # Pré-processa a imagem
-        image = preprocess_image(image_data)
-        
-        # Prompt otimizado para velocidade e precisão
-        prompt = (
-            "Esta é uma carta de Magic: The Gathering. Identifique rapidamente:\n\n"
-            "NOME: [nome da carta - MAIS IMPORTANTE]\n"
-            "DESCRIÇÃO: [breve descrição da carta]\n\n"
-            "Foque APENAS no nome da carta. Se não conseguir ler o nome completo, "
-            "tente ler pelo menos parte dele. Seja rápido e direto."
-        )
-        
-        # Processamento com timeout
-        import asyncio
-        from concurrent.futures import ThreadPoolExecutor
+        tier_config = SCAN_TIERS[tier]
+        image = resize_for_tier(image, tier_config["max_dimension"])
+        prompt = tier_config["prompt"]
+        extract = tier_config["extract"]
         
         def process_with_gemini():
             """Função que roda o Gemini de forma síncrona"""
-            return model.generate_content([prompt, image])
+            started = time.perf_counter()
+            status = "error"
+            try:
+                response = model.generate_content(
+                    [prompt, image],
+                    generation_config=tier_config["generation_config"]
+                )
+                status = "ok"
+                return response
+            finally:
+                record_upstream("gemini", tier, (time.perf_counter() - started) * 1000, status)
         
-        # Executa com timeout de 90 segundos
+        # Executa em thread (sem bloquear o event loop) com timeout de 90 segundos
         try:
-            with ThreadPoolExecutor() as executor:
-                future = executor.submit(process_with_gemini)
-                try:
-                    response = future.result(timeout=90)  # 90 segundos max
-                except TimeoutError:
-                    raise HTTPException(
-                        status_code=408, 
-                        detail="Timeout: Imagem muito complexa. Tente uma imagem mais simples ou com melhor qualidade."
-                    )
+            try:
+                response = await call_gemini(process_with_gemini)
+            except asyncio.TimeoutError:
+                raise HTTPException(
+                    status_code=408, 
+                    detail="Timeout: Imagem muito complexa. Tente uma imagem mais simples ou com melhor qualidade."
+                )
                 
             # Extrai texto da resposta
             description = None
@@ -192,12 +439,13 @@ async def describe_card_with_gemini(image_data: bytes) -> dict:
             if not description:
                 raise ValueError("Resposta do Gemini vazia")
             
-            # Extrai nome usando função avançada
-            card_name = extract_card_name_advanced(description)
+            # Extrai nome usando o extrator do tier
+            card_name = extract(description)
             
             return {
                 "description": description,
                 "card_name": card_name,
+                "tier": tier,
                 "processing_time": "< 90s"
             }
                 
@@ -208,17 +456,20 @@ async def describe_card_with_gemini(image_data: bytes) -> dict:
             # Fallback: tenta uma vez mais com prompt simplificado
             try:
                 simple_prompt = "Nome desta carta Magic:"
-                response = model.generate_content([simple_prompt, image])
+                response = await call_gemini(model.generate_content, [simple_prompt, image])
                 description = response.text if hasattr(response, 'text') else "Processamento parcial"
-                card_name = extract_card_name_advanced(description)
+                card_name = extract(description)
                 return {
                     "description": description,
                     "card_name": card_name,
+                    "tier": tier,
                     "processing_time": "fallback"
                 }
             except:
                 raise e
     
+    except HTTPException:
+        raise  # Timeout (408) já traduzido
     except Exception as e:
         print(f"❌ Erro detalhado no Gemini: {type(e).__name__}: {str(e)}")
         
@@ -234,6 +485,20 @@ async def describe_card_with_gemini(image_data: bytes) -> dict:
             raise HTTPException(status_code=500, detail=f"Erro ao processar imagem: {str(e)}")
 
 
+async def scryfall_get(client: httpx.AsyncClient, path: str, params: Optional[dict] = None) -> httpx.Response:
+    """
+    GET na Scryfall registrando o tempo da chamada no trace do scan
+    """
+    started = time.perf_counter()
+    status = None
+    try:
+        response = await client.get(f"{SCRYFALL_API}{path}", params=params)
+        status = response.status_code
+        return response
+    finally:
+        record_upstream("scryfall", path, (time.perf_counter() - started) * 1000, status)
+
+
 async def get_card_from_scryfall(card_name: str) -> dict:
     """
     Busca informações da carta na Scryfall API
@@ -241,17 +506,11 @@ async def get_card_from_scryfall(card_name: str) -> dict:
     try:
         async with httpx.AsyncClient() as client:
             # Busca exata por nome
-            response = await client.get(
-                f"{SCRYFALL_API}/cards/named",
-                params={"exact": card_name}
-            )
+            response = await scryfall_get(client, "/cards/named", {"exact": card_name})
             
             if response.status_code == 404:
                 # Tenta busca fuzzy se não encontrar exato
-                response = await client.get(
-                    f"{SCRYFALL_API}/cards/named",
-                    params={"fuzzy": card_name}
-                )
+                response = await scryfall_get(client, "/cards/named", {"fuzzy": card_name})
             
             if response.status_code != 200:
                 raise HTTPException(
@@ -264,6 +523,92 @@ async def get_card_from_scryfall(card_name: str) -> dict:
         raise HTTPException(status_code=500, detail=f"Erro ao buscar na Scryfall: {str(e)}")
 
 
+async def validate_card_name(card_name: Optional[str]) -> Optional[dict]:
+    """
+    Valida o nome lido contra o catálogo: índice local quando carregado,
+    senão busca exata na Scryfall (sem fuzzy, para não aceitar leituras ruins)
+    """
+    if not card_name:
+        return None
+
+    if card_catalog.loaded:
+        return card_catalog.lookup(card_name)
+
+    try:
+        async with httpx.AsyncClient() as client:
+            response = await scryfall_get(client, "/cards/named", {"exact": card_name})
+        return response.json() if response.status_code == 200 else None
+    except httpx.HTTPError:
+        return None
+
+
+def framed_symbol_hash(image: Image.Image) -> Optional[int]:
+    """
+    dHash do símbolo só quando a carta preenche a foto; senão o recorte fixo
+    (SYMBOL_BOX) cairia fora do símbolo e o passo é pulado
+    """
+    fill = card_fill(image)
+    if fill < SYMBOL_MIN_FILL:
+        print(f"🔣 Símbolo ignorado: carta ocupa pouco da imagem (fill {fill:.2f})")
+        return None
+    return symbol_hash(image)
+
+
+async def resolve_printing(card: dict, description: str, image: Image.Image) -> tuple:
+    """
+    Estreita as impressões do nome até a correta (coleção, número, símbolo)
+
+    Com o catálogo carregado tudo é local; sem ele, só há uma chamada extra
+    quando coleção e número foram lidos (`/cards/{set}/{number}`).
+    """
+    hints = extract_printing_hints(description)
+
+    if card_catalog.loaded:
+        printings = card_catalog.printings(card.get("name", ""))
+        chosen, info = printing_resolver.resolve(
+            printings or [card],
+            set_code=hints["set_code"],
+            collector_number=hints["collector_number"],
+            image_hash=lambda: framed_symbol_hash(image),
+        )
+        return chosen, {**info, "source": "catalog" if printings else "scryfall"}
+
+    info = {
+        "method": "default", "candidates": None, "remaining": None,
+        "ambiguous": True, "confidence": "low", "source": "scryfall",
+    }
+    if hints["set_code"] and hints["collector_number"]:
+        try:
+            async with httpx.AsyncClient() as client:
+                response = await scryfall_get(
+                    client, f"/cards/{hints['set_code']}/{hints['collector_number']}"
+                )
+            if response.status_code == 200 and response.json().get("name") == card.get("name"):
+                return response.json(), {**info, "method": "set_code+collector_number", "ambiguous": False, "confidence": "high"}
+        except httpx.HTTPError:
+            pass
+    return card, info
+
+
+def prices_from_card(card: dict, finish: str = "nonfoil") -> Optional[dict]:
+    """
+    Preços da própria impressão (bulk data / resposta da Scryfall), sem HTTP
+
+    `finish` ("nonfoil", "foil", "etched") escolhe o preço; sem ele, usa o que houver.
+    """
+    if "prices" not in card:
+        return None
+
+    finish_key = {"foil": "usd_foil", "etched": "usd_etched"}.get(finish, "usd")
+    usd = card["prices"].get(finish_key) or card["prices"].get("usd") or card["prices"].get("usd_foil")
+    tcgplayer = float(usd) if usd else 0.0
+    return {
+        "tcgplayer": tcgplayer,
+        # Converte para BRL (mock - taxa fixa)
+        "ligamagic": tcgplayer * 5.0
+    }
+
+
 async def get_card_prices(card_name: str, set_code: Optional[str] = None) -> dict:
     """
     Busca preços da carta (mock inicial - será substituído por APIs reais)
@@ -280,9 +625,10 @@ async def get_card_prices(card_name: str, set_code: Optional[str] = None) -> dic
     # Tenta buscar preços da Scryfall (algumas cartas têm preços)
     try:
         async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"{SCRYFALL_API}/cards/named",
-                params={"exact": card_name} if not set_code else {"exact": card_name, "set": set_code}
+            response = await scryfall_get(
+                client,
+                "/cards/named",
+                {"exact": card_name} if not set_code else {"exact": card_name, "set": set_code}
             )
             if response.status_code == 200:
                 data = response.json()
@@ -298,28 +644,63 @@ async def get_card_prices(card_name: str, set_code: Optional[str] = None) -> dic
     return prices
 
 
-def format_card_response(scryfall_data: dict, prices: dict) -> dict:
+def format_card_faces(scryfall_data: dict) -> list:
+    """
+    Lista as faces da carta (dupla face, split, aventura, flip); vazia para cartas normais
+    """
+    faces = []
+    for face in scryfall_data.get("card_faces", []):
+        # Split/aventura/flip compartilham a imagem da carta; dupla face tem uma por face
+        face_images = face.get("image_uris") or scryfall_data.get("image_uris", {})
+        faces.append({
+            "name": face.get("name", ""),
+            "typeLine": face.get("type_line", ""),
+            "manaCost": face.get("mana_cost", ""),
+            "description": face.get("oracle_text", ""),
+            "flavorText": face.get("flavor_text", ""),
+            "power": face.get("power"),
+            "toughness": face.get("toughness"),
+            "loyalty": face.get("loyalty"),
+            "colors": face.get("colors", scryfall_data.get("colors", [])),
+            "artist": face.get("artist", scryfall_data.get("artist", "")),
+            "imageUrl": face_images.get("normal", ""),
+            "artCropUrl": face_images.get("art_crop", ""),
+        })
+    return faces
+
+
+def format_card_response(scryfall_data: dict, prices: dict, face_index: int = 0) -> dict:
     """
     Formata a resposta no formato esperado pelo app Flutter com informações expandidas
+
+    Para cartas com várias faces, `face_index` indica a face escaneada: os campos
+    principais vêm dela e todas as faces ficam em `faces`.
     """
+    card_faces = scryfall_data.get("card_faces") or []
+    face_index = face_index if 0 <= face_index < len(card_faces) else 0
+    scanned_face = card_faces[face_index] if card_faces else {}
+
     # Pega a melhor imagem disponível
     image_url = (
         scryfall_data.get("image_uris", {}).get("normal") or
         scryfall_data.get("image_uris", {}).get("large") or
-        scryfall_data.get("card_faces", [{}])[0].get("image_uris", {}).get("normal") or
+        scanned_face.get("image_uris", {}).get("normal") or
         ""
     )
     
     # Pega também outras versões da imagem
-    image_uris = scryfall_data.get("image_uris", {})
+    image_uris = scryfall_data.get("image_uris") or scanned_face.get("image_uris", {})
     art_crop_url = image_uris.get("art_crop", "")
     border_crop_url = image_uris.get("border_crop", "")
     
     # Determina raridade
     rarity = scryfall_data.get("rarity", "common").capitalize()
     
-    # Gera ID único baseado no nome e set
+    # Gera ID único baseado no nome, set e número de colecionador
     card_id = f"{scryfall_data.get('name', '').lower().replace(' ', '_')}_{scryfall_data.get('set', '').lower()}"
+    if scryfall_data.get("collector_number"):
+        # Identifica a impressão, não só a coleção
+        card_id += f"_{scryfall_data['collector_number'].lower()}"
     
     # Extrai informações adicionais
     type_line = scryfall_data.get("type_line", "")
@@ -350,15 +731,15 @@ def format_card_response(scryfall_data: dict, prices: dict) -> dict:
     scryfall_uri = scryfall_data.get("scryfall_uri", "")
     tcgplayer_id = scryfall_data.get("tcgplayer_id")
     
-    # Para cartas de dupla face, pega as informações da primeira face
+    # Para cartas com várias faces, pega as informações da face escaneada
     oracle_text = scryfall_data.get("oracle_text", "")
-    if not type_line and "card_faces" in scryfall_data and scryfall_data["card_faces"]:
-        first_face = scryfall_data["card_faces"][0]
-        type_line = first_face.get("type_line", "")
-        mana_cost = first_face.get("mana_cost", "")
-        power = first_face.get("power")
-        toughness = first_face.get("toughness")
-        oracle_text = first_face.get("oracle_text", oracle_text)
+    if scanned_face:
+        type_line = scanned_face.get("type_line", type_line)
+        mana_cost = scanned_face.get("mana_cost", mana_cost)
+        power = scanned_face.get("power", power)
+        toughness = scanned_face.get("toughness", toughness)
+        oracle_text = scanned_face.get("oracle_text", oracle_text)
+        flavor_text = scanned_face.get("flavor_text", flavor_text)
     
     return {
         "id": card_id,
@@ -384,6 +765,8 @@ def format_card_response(scryfall_data: dict, prices: dict) -> dict:
         "artist": artist,
         "keywords": keywords,
         "layout": card_layout,
+        "faces": format_card_faces(scryfall_data),
+        "scannedFaceIndex": face_index,
         "releasedAt": released_at,
         "legalities": legalities,
         "edhrecRank": edhrec_rank,
@@ -395,6 +778,22 @@ def format_card_response(scryfall_data: dict, prices: dict) -> dict:
     }
 
 
+@app.on_event("startup")
+async def load_catalog():
+    """
+    Carrega o catálogo local, se o arquivo de bulk data existir
+    """
+    if not os.path.exists(CATALOG_PATH):
+        print(f"⚠️  Catálogo local não encontrado em {CATALOG_PATH}; validando nomes pela Scryfall")
+        return
+    count = await asyncio.to_thread(card_catalog.load, CATALOG_PATH)
+    print(f"📚 Catálogo local carregado: {count} cartas")
+
+    if os.path.exists(SYMBOL_INDEX_PATH):
+        sets = await asyncio.to_thread(printing_resolver.load_symbol_index, SYMBOL_INDEX_PATH)
+        print(f"🔣 Índice de símbolos carregado: {sets} coleções")
+
+
 @app.get("/")
 async def root():
     return {"message": "Magic Scanner API", "status": "running"}
@@ -405,6 +804,22 @@ async def health():
     return {"status": "healthy"}
 
 
+@app.get("/api/scan/config")
+async def scan_config():
+    """
+    Parâmetros de captura preferidos: o app deve recortar/reduzir a imagem
+    antes do upload para pular o redimensionamento no servidor
+    """
+    return {
+        "max_dimension": CAPTURE_MAX_DIMENSION,
+        "formats": list(CAPTURE_FORMATS.values()),
+        "preferred_format": CAPTURE_PREFERRED_FORMAT,
+        "quality": CAPTURE_QUALITY,
+        "max_upload_bytes": MAX_UPLOAD_BYTES,
+        "original_size_field": "original_size",
+    }
+
+
 @app.get("/test/gemini")
 async def test_gemini():
     """
@@ -426,166 +841,481 @@ async def test_gemini():
         }
 
 
-@app.post("/api/debug-image")
-async def debug_image(file: UploadFile = File(...)):
+def get_client_id(request: HTTPConnection) -> str:
     """
-    Endpoint para debug: analisa problemas com imagens específicas
+    Identifica o cliente (Request ou WebSocket) para o rodízio justo do escalonador
+
+    A base é o IP (o uvicorn já o resolve pelo X-Forwarded-For do proxy). O
+    X-Client-Id do app não é autenticado: só separa aparelhos atrás do mesmo IP
+    (NAT de operadora), no máximo MAX_CLIENT_IDS_PER_IP ids ativos por IP; ids
+    além disso dividem o balde do IP, então trocar de id não rende mais vezes.
+    """
+    declared = (request.headers.get("X-Client-Id") or "")[:64]
+    if not request.client:
+        return declared or "anonymous"
+
+    ip = request.client.host
+    if not declared:
+        return ip
+
+    now = time.monotonic()
+    if len(client_ids_by_ip) > 10000:
+        # Esquece IPs sem ids ativos para não crescer sem limite
+        for stale_ip in [key for key, ids in client_ids_by_ip.items() if max(ids.values()) < now - CLIENT_ID_TTL_SECONDS]:
+            del client_ids_by_ip[stale_ip]
+
+    active = {
+        client_id: last_seen
+        for client_id, last_seen in client_ids_by_ip.get(ip, {}).items()
+        if now - last_seen <= CLIENT_ID_TTL_SECONDS
+    }
+    if declared not in active and len(active) >= MAX_CLIENT_IDS_PER_IP:
+        client_ids_by_ip[ip] = active
+        return ip
+
+    active[declared] = now
+    client_ids_by_ip[ip] = active
+    return f"{ip}/{declared}"
+
+
+async def read_upload(file: UploadFile) -> bytes:
+    """
+    Lê e valida o arquivo enviado (tipo, vazio, tamanho máximo)
+    """
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise HTTPException(status_code=400, detail="Arquivo deve ser uma imagem (JPG, PNG, WebP)")
+    
+    image_data = await file.read()
+    if len(image_data) == 0:
+        raise HTTPException(status_code=400, detail="Imagem vazia")
+    
+    # Validação de tamanho (máximo 10MB)
+    if len(image_data) > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=400, detail="Imagem muito grande. Máximo 10MB")
+
+    return image_data
+
+
+def scan_error_detail(e: Exception) -> str:
+    """
+    Traduz erros não tratados em mensagens amigáveis para o app
+    """
+    error_msg = str(e)
+    if "API key" in error_msg or "authentication" in error_msg.lower():
+        return "Erro de autenticação com Gemini. Verifique a configuração da API."
+    elif "connection" in error_msg.lower() or "network" in error_msg.lower():
+        return "Erro de conexão. Verifique sua internet e tente novamente."
+    elif "timeout" in error_msg.lower():
+        return "Timeout na requisição. Tente com uma imagem menor."
+    elif "memory" in error_msg.lower() or "size" in error_msg.lower():
+        return "Imagem muito grande para processar. Use uma imagem menor."
+    else:
+        return f"Erro interno do servidor: {error_msg}"
+
+
+async def run_recognition_tier(image: Image.Image, tier: str, client_id: str, priority: str) -> dict:
+    """
+    Roda um tier do Gemini passando pelo escalonador (429 quando a fila enche)
     """
     try:
-        image_data = await file.read()
-        
-        # Informações básicas
-        info = {
-            "file_info": {
-                "filename": file.filename,
-                "content_type": file.content_type,
-                "size_bytes": len(image_data),
-                "size_mb": round(len(image_data) / (1024*1024), 2)
-            },
-            "validations": {}
-        }
-        
-        # Validação 1: Tipo de arquivo
-        if file.content_type and file.content_type.startswith("image/"):
-            info["validations"]["content_type"] = "✅ OK"
-        else:
-            info["validations"]["content_type"] = f"❌ Inválido: {file.content_type}"
-        
-        # Validação 2: Tamanho
-        if len(image_data) > 0:
-            if len(image_data) <= 10 * 1024 * 1024:  # 10MB
-                info["validations"]["size"] = "✅ OK"
-            else:
-                info["validations"]["size"] = "⚠️  Muito grande (>10MB)"
-        else:
-            info["validations"]["size"] = "❌ Arquivo vazio"
-        
-        # Validação 3: Formato da imagem
-        try:
-            from PIL import Image
-            image = Image.open(io.BytesIO(image_data))
-            info["image_details"] = {
-                "format": image.format,
-                "mode": image.mode,
-                "size": image.size,
-                "has_transparency": image.mode in ('RGBA', 'LA', 'P')
-            }
-            info["validations"]["format"] = "✅ Imagem válida"
-        except Exception as e:
-            info["validations"]["format"] = f"❌ Erro: {str(e)}"
-            return {"status": "error", "info": info}
-        
-        # Validação 4: Teste básico com Gemini
-        try:
-            processed_image = preprocess_image(image_data)
-            simple_prompt = "Descreva brevemente o que você vê nesta imagem."
-            response = model.generate_content([simple_prompt, processed_image])
-            
-            if hasattr(response, 'text') and response.text:
-                info["gemini_test"] = {
-                    "status": "✅ Sucesso",
-                    "preview": response.text[:200] + "..." if len(response.text) > 200 else response.text
-                }
-            else:
-                info["gemini_test"] = {"status": "❌ Resposta vazia"}
-        except Exception as e:
-            info["gemini_test"] = {"status": f"❌ Erro: {str(e)}"}
-        
-        return {"status": "success", "debug_info": info}
-        
+        gemini_result = await recognition_scheduler.run(
+            client_id, priority, describe_card_with_gemini, image, tier
+        )
+    except SchedulerOverloaded as so:
+        print(f"🚦 Scan recusado ({priority}, cliente {client_id}): {so.reason}")
+        raise HTTPException(
+            status_code=429,
+            detail=f"Servidor ocupado: {so.reason}. Tente novamente em {so.retry_after}s.",
+            headers={"Retry-After": str(so.retry_after)}
+        )
+    except HTTPException as he:
+        # Re-propaga HTTPExceptions (já têm mensagens adequadas)
+        raise he
     except Exception as e:
-        return {
-            "status": "error", 
-            "message": str(e),
-            "type": type(e).__name__
-        }
+        print(f"❌ Erro na descrição: {type(e).__name__}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Erro ao processar imagem: {str(e)}")
 
+    print(f"✅ Descrição obtida (tier {tier})")
+    if gemini_result["card_name"]:
+        print(f"🎯 Nome extraído: '{gemini_result['card_name']}'")
+    else:
+        print(f"⚠️  Nome não identificado automaticamente")
+    return gemini_result
 
 
-@app.post("/api/scan")
-async def scan_card(file: UploadFile = File(...)):
+def can_escalate(elapsed_ms: float, latency_budget_ms: Optional[int]) -> bool:
     """
-    Endpoint melhorado: recebe imagem, valida, processa e busca dados da carta
+    Decide se ainda cabe rodar o tier "accurate" dentro do orçamento de latência
+    """
+    if latency_budget_ms is None:
+        return True
+    expected_ms = tier_stats["avg_ms"]["accurate"] or 0.0
+    return elapsed_ms + expected_ms <= latency_budget_ms
+
+
+def record_tier_timing(tier: str, elapsed_ms: float):
+    previous = tier_stats["avg_ms"][tier]
+    tier_stats["avg_ms"][tier] = elapsed_ms if previous is None else 0.8 * previous + 0.2 * elapsed_ms
+
+
+async def run_scan_pipeline(
+    image_data: bytes,
+    content_type: str,
+    original_size: Optional[int] = None,
+    client_id: str = "anonymous",
+    priority: str = PRIORITY_INTERACTIVE,
+    mode: Optional[str] = None,
+    latency_budget_ms: Optional[int] = None,
+) -> dict:
+    """
+    Pipeline completo de um scan: Gemini (via escalonador) + Scryfall + preços
+
+    No modo "auto" roda o tier "fast" e só escala para "accurate" quando o
+    nome lido não passa na validação do catálogo (e o orçamento permite).
     """
+    scan_started = time.perf_counter()
+    print(f"🔍 Processando carta com Gemini Vision...")
+    print(f"📏 Tamanho: {len(image_data)} bytes ({len(image_data)/1024:.1f}KB)")
+    print(f"📄 Tipo: {content_type}")
+
+    mode = mode if mode in SCAN_MODES else SCAN_DEFAULT_MODE
+    tiers = ["fast", "accurate"] if mode == "auto" else [mode]
+
+    preprocess_info = {}
     try:
-        # Validação básica
-        if not file.content_type or not file.content_type.startswith("image/"):
-            raise HTTPException(status_code=400, detail="Arquivo deve ser uma imagem (JPG, PNG, WebP)")
-        
-        image_data = await file.read()
-        if len(image_data) == 0:
-            raise HTTPException(status_code=400, detail="Imagem vazia")
-        
-        # Validação de tamanho (máximo 10MB)
-        if len(image_data) > 10 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail="Imagem muito grande. Máximo 10MB")
+        image = preprocess_image(image_data, preprocess_info)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Formato de imagem inválido. Use JPG, PNG ou WebP. ({str(e)})")
 
-        print(f"🔍 Processando carta com Gemini Vision...")
-        print(f"📏 Tamanho: {len(image_data)} bytes ({len(image_data)/1024:.1f}KB)")
-        print(f"📄 Tipo: {file.content_type}")
-        
-        # Processa com Gemini
+    # Processa com Gemini tier a tier, respeitando a fila de prioridades
+    queued_at = time.perf_counter()
+    tier_timings = {}
+    update_trace(mode=mode, preprocess=preprocess_info, tier_ms=tier_timings)
+    validated_card = None
+    gemini_result = None
+    best_candidate = None  # Último tier que leu algum nome (para o fuzzy da Scryfall)
+    for index, tier in enumerate(tiers):
+        elapsed_ms = (time.perf_counter() - queued_at) * 1000
+        if index > 0:
+            if not can_escalate(elapsed_ms, latency_budget_ms):
+                print(f"⏱️  Sem orçamento para escalar ({elapsed_ms:.0f}ms de {latency_budget_ms}ms)")
+                break
+            print(f"⬆️  Nome '{gemini_result['card_name']}' não validado, escalando para '{tier}'")
+            tier_stats["escalations"] += 1
+
+        tier_started = time.perf_counter()
+        gemini_result = await run_recognition_tier(image, tier, client_id, priority)
+        tier_timings[tier] = round((time.perf_counter() - tier_started) * 1000, 1)
+        record_tier_timing(tier, tier_timings[tier])
+
+        if gemini_result["card_name"]:
+            best_candidate = gemini_result
+        validated_card = await validate_card_name(gemini_result["card_name"])
+        if validated_card:
+            break
+    if not validated_card and best_candidate and not gemini_result["card_name"]:
+        # O tier seguinte não leu nome: volta para o candidato anterior
+        print(f"↩️  Usando o nome lido pelo tier '{best_candidate['tier']}': {best_candidate['card_name']}")
+        gemini_result = best_candidate
+    recognition_ms = (time.perf_counter() - queued_at) * 1000
+
+    description = gemini_result["description"]
+    card_name = gemini_result["card_name"]
+    answered_tier = gemini_result["tier"]
+    attempt = len(tier_timings)
+    tier_stats["scans"] += 1
+    tier_stats["answered_by"][answered_tier] += 1
+    print(f"🏷️  Tier que respondeu: {answered_tier} (modo {mode}, tentativas {list(tier_timings)})")
+
+    # Busca dados adicionais se nome foi encontrado
+    scryfall_data = None
+    prices = None
+    
+    printing_info = None
+    
+    if validated_card:
+        scryfall_data = validated_card
+    elif card_name:
+        print(f"📚 Buscando '{card_name}' na Scryfall...")
         try:
-            gemini_result = await describe_card_with_gemini(image_data)
-            description = gemini_result["description"]
-            card_name = gemini_result["card_name"]
-            attempt = gemini_result.get("attempt", 1)
-            
-            print(f"✅ Descrição obtida (tentativa {attempt})")
-            if card_name:
-                print(f"🎯 Nome extraído: '{card_name}'")
-            else:
-                print(f"⚠️  Nome não identificado automaticamente")
-                
+            scryfall_data = await get_card_from_scryfall(card_name)
+            print(f"✅ Carta encontrada: {scryfall_data.get('name', 'N/A')}")
         except HTTPException as he:
-            # Re-propaga HTTPExceptions (já têm mensagens adequadas)
-            raise he
+            if he.status_code == 404:
+                print(f"🔍 Carta '{card_name}' não encontrada na Scryfall")
+            else:
+                print(f"⚠️  Erro ao buscar dados: {he.detail}")
         except Exception as e:
-            print(f"❌ Erro na descrição: {type(e).__name__}: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Erro ao processar imagem: {str(e)}")
+            print(f"⚠️  Erro inesperado: {type(e).__name__}: {str(e)}")
 
-        # Busca dados adicionais se nome foi encontrado
-        scryfall_data = None
-        prices = None
-        
-        if card_name:
-            print(f"📚 Buscando '{card_name}' na Scryfall...")
-            try:
-                scryfall_data = await get_card_from_scryfall(card_name)
-                print(f"✅ Carta encontrada: {scryfall_data.get('name', 'N/A')}")
-                
-                # Busca preços
-                set_code = scryfall_data.get("set")
-                prices = await get_card_prices(card_name, set_code)
-                print(f"💰 Preços: TCG=${prices.get('tcgplayer', 0):.2f}")
-                
-            except HTTPException as he:
-                if he.status_code == 404:
-                    print(f"🔍 Carta '{card_name}' não encontrada na Scryfall")
-                else:
-                    print(f"⚠️  Erro ao buscar dados: {he.detail}")
-            except Exception as e:
-                print(f"⚠️  Erro inesperado: {type(e).__name__}: {str(e)}")
-
-        # Monta resposta final
-        response = {
-            "success": True,
-            "description": description,
-            "card_name": card_name,
-            "processing_info": {
-                "file_size": len(image_data),
-                "content_type": file.content_type,
-                "gemini_attempts": attempt
-            }
+    if scryfall_data:
+        # Escolhe a impressão correta antes de pegar os preços
+        scryfall_data, printing_info = await resolve_printing(scryfall_data, description, image)
+        print(f"🖨️  Impressão: {scryfall_data.get('set', '?').upper()} #{scryfall_data.get('collector_number', '?')} ({printing_info['method']})")
+
+        # Busca preços da impressão escolhida
+        prices = prices_from_card(scryfall_data)
+        if prices is None:
+            prices = await get_card_prices(scryfall_data.get("name", card_name), scryfall_data.get("set"))
+        print(f"💰 Preços: TCG=${prices.get('tcgplayer', 0):.2f}")
+
+    lookup_ms = (time.perf_counter() - queued_at) * 1000 - recognition_ms
+
+    # Monta resposta final
+    response = {
+        "success": True,
+        "description": description,
+        "card_name": card_name,
+        "processing_info": {
+            "file_size": len(image_data),
+            "content_type": content_type,
+            "gemini_attempts": attempt,
+            "priority": priority,
+            "mode": mode,
+            "tier": answered_tier,
+            "tiers_tried": list(tier_timings),
+            "tier_ms": tier_timings,
+            "catalog_validated": validated_card is not None,
+            # Preços do catálogo são do último download do bulk data; da Scryfall, ao vivo
+            "prices_as_of": card_catalog.prices_as_of if printing_info and printing_info["source"] == "catalog" else None,
+            "printing": printing_info,
+            "recognition_ms": round(recognition_ms, 1),
+            "stage_ms": {
+                "preprocess": round(preprocess_info.get("preprocess_ms", 0.0), 1),
+                "recognition": round(recognition_ms, 1),
+                "lookup": round(lookup_ms, 1),
+                "total": round((time.perf_counter() - scan_started) * 1000, 1),
+            },
+            "upload_optimization": estimate_latency_saved(
+                len(image_data),
+                original_size,
+                preprocess_info.get("fast_path", False),
+                preprocess_info.get("preprocess_ms", 0.0),
+            ),
         }
+    }
+    
+    if scryfall_data:
+        face_index = matching_face_index(scryfall_data, card_name)
+        response["card_data"] = format_card_response(scryfall_data, prices or {}, face_index)
+        response["data_source"] = "scryfall"
+    else:
+        response["data_source"] = "gemini_only"
+        tier_stats["unresolved"] += 1
         
-        if scryfall_data:
-            response["card_data"] = format_card_response(scryfall_data, prices or {})
-            response["data_source"] = "scryfall"
-        else:
-            response["data_source"] = "gemini_only"
-            
-        return response
+    return response
+
+
+async def process_scan(
+    image_data: bytes,
+    content_type: str,
+    original_size: Optional[int] = None,
+    client_id: str = "anonymous",
+    priority: str = PRIORITY_INTERACTIVE,
+    mode: Optional[str] = None,
+    latency_budget_ms: Optional[int] = None,
+    profile: bool = False,
+) -> dict:
+    """
+    Roda o pipeline com trace de estágios e chamadas externas
+
+    Perfila o scan quando pedido (`profile`) ou amostrado (PROFILE_SAMPLE_RATE)
+    e grava no ring buffer os scans acima de SLOW_SCAN_MS.
+    """
+    trace = {
+        "upstream": [],
+        "client_id": client_id,
+        "priority": priority,
+        "content_type": content_type,
+        "file_size": len(image_data),
+    }
+    token = current_trace.set(trace)
+
+    reason = "requested" if profile else None
+    if not reason and PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+        reason = "sampled"
+    # Com um profiler por amostragem (pyinstrument) todo scan é perfilado, para
+    # que um scan lento já tenha o relatório; o relatório só é guardado se preciso
+    # Perfis pedidos/amostrados têm prioridade sobre os de fundo (ver ScanProfiler)
+    profiler = None
+    if reason or (PROFILE_SLOW_SCANS and ScanProfiler.sampling):
+        profiler = ScanProfiler(background=not reason)
+        profiler.start()
+
+    started = time.perf_counter()
+    result = None
+    error = None
+    try:
+        result = await run_scan_pipeline(
+            image_data,
+            content_type,
+            original_size=original_size,
+            client_id=client_id,
+            priority=priority,
+            mode=mode,
+            latency_budget_ms=latency_budget_ms,
+        )
+    except HTTPException as he:
+        error = f"{he.status_code}: {he.detail}"
+        raise
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)}"
+        raise
+    finally:
+        current_trace.reset(token)
+        total_ms = (time.perf_counter() - started) * 1000
+        report = profiler.stop() if profiler else None
+        slow = total_ms >= SLOW_SCAN_MS
+
+        if reason or slow:
+            capture_id = await capture_scan(trace, result, error, total_ms, reason, report, profiler)
+            print(f"🐢 Scan capturado ({total_ms:.0f}ms): {capture_id}")
+            if result is not None:
+                result["processing_info"]["profile_id"] = capture_id
+
+    return result
+
+
+async def capture_scan(
+    trace: dict,
+    result: Optional[dict],
+    error: Optional[str],
+    total_ms: float,
+    reason: Optional[str],
+    report: Optional[str],
+    profiler: Optional[ScanProfiler],
+) -> Optional[str]:
+    """
+    Grava a captura do scan (tempos, dimensões, chamadas externas, perfil)
+    """
+    preprocess = trace.get("preprocess", {})
+    info = (result or {}).get("processing_info", {})
+    entry = {
+        "reason": "slow" if total_ms >= SLOW_SCAN_MS else reason,
+        "total_ms": round(total_ms, 1),
+        "client_id": trace["client_id"],
+        "priority": trace["priority"],
+        "mode": trace.get("mode"),
+        "content_type": trace["content_type"],
+        "file_size": trace["file_size"],
+        "image": {
+            "original": preprocess.get("original_dimensions"),
+            "processed": preprocess.get("processed_dimensions"),
+            "fast_path": preprocess.get("fast_path"),
+        },
+        "stage_ms": info.get("stage_ms"),
+        "tier_ms": trace.get("tier_ms"),
+        "upstream": trace["upstream"],
+        "card_name": (result or {}).get("card_name"),
+        "error": error,
+        "profile": {"engine": profiler.engine, "report": report} if report else None,
+        # Sem relatório porque outro perfil ocupava o profiler
+        "profile_skipped": profiler.skipped if profiler and not report else None,
+    }
+    try:
+        return await asyncio.to_thread(profile_store.save, entry)
+    except OSError as e:
+        print(f"⚠️  Falha ao gravar captura do scan: {e}")
+        return None
+
+
+def is_debug_authorized(request: Request) -> bool:
+    token = request.headers.get("X-Debug-Token", "")
+    return bool(DEBUG_TOKEN) and secrets.compare_digest(token, DEBUG_TOKEN)
+
+
+def require_debug(request: Request):
+    """
+    Protege os endpoints de debug: desabilitados sem DEBUG_TOKEN configurado
+    """
+    if not DEBUG_TOKEN:
+        raise HTTPException(status_code=404, detail="Debug desabilitado")
+    if not is_debug_authorized(request):
+        raise HTTPException(status_code=401, detail="X-Debug-Token inválido")
+
+
+def wants_profile(request: Request) -> bool:
+    """
+    Perfil sob demanda: header `X-Profile: 1` junto com um X-Debug-Token válido
+    """
+    return request.headers.get("X-Profile") == "1" and is_debug_authorized(request)
+
+
+@app.get("/api/debug/profiles")
+async def list_profiles(request: Request):
+    """
+    Lista os scans capturados (lentos, amostrados ou pedidos com X-Profile)
+    """
+    require_debug(request)
+    return {
+        "slow_scan_ms": SLOW_SCAN_MS,
+        "sample_rate": PROFILE_SAMPLE_RATE,
+        "capacity": profile_store.capacity,
+        "captures": await asyncio.to_thread(profile_store.list),
+    }
+
+
+@app.get("/api/debug/profiles/{capture_id}")
+async def get_profile(capture_id: str, request: Request):
+    """
+    Captura completa: tempos por estágio, chamadas externas e relatório do perfil
+    """
+    require_debug(request)
+    entry = await asyncio.to_thread(profile_store.get, capture_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Captura não encontrada")
+    return entry
+
+
+@app.get("/api/scan/queue")
+async def scan_queue():
+    """
+    Estado do escalonador de reconhecimento (filas, espera estimada)
+    """
+    return recognition_scheduler.snapshot()
+
+
+@app.get("/api/scan/tiers")
+async def scan_tiers():
+    """
+    Qual tier respondeu cada scan (para ajustar a divisão fast / accurate)
+    """
+    return {
+        "default_mode": SCAN_DEFAULT_MODE,
+        "catalog": card_catalog.info(),
+        "symbol_index": printing_resolver.info(),
+        **tier_stats,
+    }
+
+
+@app.post("/api/scan")
+async def scan_card(
+    request: Request,
+    file: UploadFile = File(...),
+    original_size: Optional[int] = Form(None),
+    mode: Optional[str] = Form(None),
+    latency_budget_ms: Optional[int] = Form(None),
+):
+    """
+    Endpoint melhorado: recebe imagem, valida, processa e busca dados da carta
+
+    `original_size` (opcional) é o tamanho em bytes da foto antes da redução
+    feita no app, usado para estimar a latência economizada.
+    `mode` ("auto", "fast" ou "accurate") e `latency_budget_ms` controlam o
+    pipeline em tiers. Scans deste endpoint entram na fila interativa.
+    """
+    try:
+        image_data = await read_upload(file)
+        return await process_scan(
+            image_data,
+            file.content_type,
+            original_size=original_size,
+            client_id=get_client_id(request),
+            priority=PRIORITY_INTERACTIVE,
+            mode=mode,
+            latency_budget_ms=latency_budget_ms,
+            profile=wants_profile(request),
+        )
 
     except HTTPException as he:
         # Re-propaga HTTPExceptions
@@ -595,29 +1325,360 @@ async def scan_card(file: UploadFile = File(...)):
         import traceback
         error_trace = traceback.format_exc()
         error_type = type(e).__name__
-        error_msg = str(e)
         
         print(f"❌ ERRO CRÍTICO ({error_type}):")
         print(error_trace)
-        
-        # Mensagens de erro específicas
-        if "API key" in error_msg or "authentication" in error_msg.lower():
-            detail = "Erro de autenticação com Gemini. Verifique a configuração da API."
-        elif "connection" in error_msg.lower() or "network" in error_msg.lower():
-            detail = "Erro de conexão. Verifique sua internet e tente novamente."
-        elif "timeout" in error_msg.lower():
-            detail = "Timeout na requisição. Tente com uma imagem menor."
-        elif "memory" in error_msg.lower() or "size" in error_msg.lower():
-            detail = "Imagem muito grande para processar. Use uma imagem menor."
-        else:
-            detail = f"Erro interno do servidor: {error_msg}"
             
-        raise HTTPException(status_code=500, detail=detail)
+        raise HTTPException(status_code=500, detail=scan_error_detail(e))
+
+
+def frame_selection_info(metrics: list, order: list, scoring_ms: float) -> dict:
+    return {
+        "frames": len(metrics),
+        "selected": order[0],
+        "scoring_ms": round(scoring_ms, 1),
+        "metrics": [public_metrics(frame) for frame in metrics],
+    }
+
+
+@app.post("/api/scan/burst")
+async def scan_burst(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    mode: Optional[str] = Form(None),
+):
+    """
+    Recebe uma rajada de frames, escolhe o mais nítido com carta no quadro
+    e envia só ele para o reconhecimento
+    """
+    if len(files) > BURST_MAX_FRAMES:
+        raise HTTPException(status_code=400, detail=f"Máximo de {BURST_MAX_FRAMES} frames por rajada")
+
+    frames = [await read_upload(file) for file in files]
+
+    started = time.perf_counter()
+    try:
+        metrics = await asyncio.to_thread(lambda: [score_frame(frame) for frame in frames])
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Formato de imagem inválido. Use JPG, PNG ou WebP. ({str(e)})")
+    order = rank_frames(metrics)
+    scoring_ms = (time.perf_counter() - started) * 1000
+
+    best = order[0]
+    print(f"🎞️  Rajada: frame {best + 1}/{len(frames)} escolhido (nitidez {metrics[best]['sharpness']:.0f}, {scoring_ms:.1f}ms)")
+    try:
+        result = await process_scan(
+            frames[best],
+            files[best].content_type,
+            client_id=get_client_id(request),
+            priority=PRIORITY_INTERACTIVE,
+            mode=mode,
+            profile=wants_profile(request),
+        )
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        print(f"❌ Erro na rajada: {type(e).__name__}: {str(e)}")
+        raise HTTPException(status_code=500, detail=scan_error_detail(e))
+
+    result["processing_info"]["frame_selection"] = frame_selection_info(metrics, order, scoring_ms)
+    return result
+
+
+@app.websocket("/api/scan/stream")
+async def scan_stream(websocket: WebSocket, mode: Optional[str] = None):
+    """
+    Scan contínuo ("varrer a mesa"): o app envia frames da câmera (bytes JPEG)
+    e recebe mensagens JSON `result`, `unresolved` ou `error`.
+
+    A cada STREAM_WINDOW frames com carta, o melhor vai para o reconhecimento.
+    Frames que chegam durante um reconhecimento são descartados. Depois de um
+    match validado no catálogo, para de reconhecer até a cena mudar.
+    """
+    await websocket.accept()
+    client_id = get_client_id(websocket)
+    state = {"recognized_signature": None}
+    window = []
+    pending = None
+
+    async def recognize(frame_data: bytes, metrics: list, order: list, scoring_ms: float):
+        best = metrics[order[0]]
+        try:
+            result = await process_scan(
+                frame_data, "image/jpeg", client_id=client_id, priority=PRIORITY_INTERACTIVE, mode=mode
+            )
+        except HTTPException as he:
+            await websocket.send_json({"type": "error", "status": he.status_code, "detail": he.detail})
+            return
+        except Exception as e:
+            print(f"❌ Erro no stream: {type(e).__name__}: {str(e)}")
+            await websocket.send_json({"type": "error", "status": 500, "detail": scan_error_detail(e)})
+            return
+
+        result["processing_info"]["frame_selection"] = frame_selection_info(metrics, order, scoring_ms)
+        if result["processing_info"].get("catalog_validated"):
+            # Match confiável: não reconhece de novo enquanto a mesma carta estiver no quadro
+            state["recognized_signature"] = best["signature"]
+            await websocket.send_json({"type": "result", **result})
+        else:
+            await websocket.send_json({"type": "unresolved", "card_name": result.get("card_name")})
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            frame_data = message.get("bytes")
+            if frame_data is None:
+                await websocket.send_json({"type": "error", "status": 400, "detail": "Envie os frames como mensagens binárias (JPEG)"})
+                continue
+            if len(frame_data) > MAX_UPLOAD_BYTES:
+                await websocket.send_json({"type": "error", "status": 400, "detail": "Imagem muito grande. Máximo 10MB"})
+                continue
+            if pending is not None and not pending.done():
+                continue  # Reconhecimento em andamento: descarta o frame
+
+            started = time.perf_counter()
+            try:
+                metrics = await asyncio.to_thread(score_frame, frame_data)
+            except Exception:
+                await websocket.send_json({"type": "error", "status": 400, "detail": "Frame inválido"})
+                continue
+
+            if metrics["presence"] < MIN_PRESENCE:
+                window.clear()
+                continue
+            if same_scene(state["recognized_signature"], metrics["signature"]):
+                continue
+            state["recognized_signature"] = None
+
+            window.append((frame_data, metrics, (time.perf_counter() - started) * 1000))
+            if len(window) >= STREAM_WINDOW:
+                window_metrics = [frame[1] for frame in window]
+                order = rank_frames(window_metrics)
+                scoring_ms = sum(frame[2] for frame in window)
+                pending = asyncio.create_task(
+                    recognize(window[order[0]][0], window_metrics, order, scoring_ms)
+                )
+                window = []
+    except WebSocketDisconnect:
+        if pending is not None and not pending.done():
+            pending.cancel()
+
+
+@app.post("/api/scan/batch")
+async def scan_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    mode: Optional[str] = Form(None),
+):
+    """
+    Scan em lote (importação de coleções): entra na fila de baixa prioridade.
+
+    Cada imagem é escalonada separadamente; itens recusados pelo controle de
+    admissão voltam com `status: 429` e `retry_after`, sem derrubar o lote.
+    """
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Máximo de {BATCH_MAX_FILES} imagens por lote")
+
+    client_id = get_client_id(request)
+
+    async def scan_one(file: UploadFile) -> dict:
+        try:
+            image_data = await read_upload(file)
+            result = await process_scan(
+                image_data, file.content_type, client_id=client_id, priority=PRIORITY_BATCH, mode=mode
+            )
+            return {"filename": file.filename, "status": 200, "result": result}
+        except HTTPException as he:
+            item = {"filename": file.filename, "status": he.status_code, "error": he.detail}
+            if he.headers and "Retry-After" in he.headers:
+                item["retry_after"] = int(he.headers["Retry-After"])
+            return item
+        except Exception as e:
+            print(f"❌ Erro no lote ({file.filename}): {type(e).__name__}: {str(e)}")
+            return {"filename": file.filename, "status": 500, "error": scan_error_detail(e)}
+
+    results = await asyncio.gather(*(scan_one(file) for file in files))
+
+    rejected = [item for item in results if item["status"] == 429]
+    if rejected and len(rejected) == len(results):
+        retry_after = max(item.get("retry_after", 1) for item in rejected)
+        raise HTTPException(
+            status_code=429,
+            detail=f"Servidor ocupado. Tente novamente em {retry_after}s.",
+            headers={"Retry-After": str(retry_after)}
+        )
+
+    return {
+        "success": True,
+        "total": len(results),
+        "completed": sum(1 for item in results if item["status"] == 200),
+        "results": results,
+    }
+
+
+async def read_deck_list(request: Request) -> str:
+    """
+    Lê o corpo (texto puro) em partes, respeitando o tamanho máximo
+    """
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > DECK_LIST_MAX_BYTES:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Lista muito grande. Máximo {DECK_LIST_MAX_BYTES // 1024}KB"
+            )
+        chunks.append(chunk)
+
+    text = b"".join(chunks).decode("utf-8-sig", errors="replace")
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="Lista de deck vazia")
+    return text
+
+
+def resolve_deck_name(name: str) -> tuple:
+    """
+    Retorna (impressões, tipo de match, nome encontrado): busca exata e, se
+    falhar, aproximada
+    """
+    printings = card_catalog.printings(name)
+    if printings:
+        return printings, "exact", name
+
+    closest = card_catalog.closest_name(name)
+    if closest:
+        return card_catalog.printings(closest), "fuzzy", closest
+    return [], None, None
+
+
+def resolve_deck_list(text: str) -> dict:
+    """
+    Resolve a lista inteira no catálogo local, sem chamadas HTTP
+
+    Cada nome distinto é buscado uma vez; linhas repetidas da mesma impressão
+    na mesma seção são somadas.
+    """
+    started = time.perf_counter()
+    resolved_names = {}
+    entries = {}
+    unresolved = []
+    lines = 0
+
+    for line in parse_deck_list(io.StringIO(text)):
+        lines += 1
+        if lines > DECK_LIST_MAX_LINES:
+            raise HTTPException(status_code=400, detail=f"Máximo de {DECK_LIST_MAX_LINES} linhas por lista")
+
+        key = normalize_name(line["name"])
+        if key not in resolved_names:
+            resolved_names[key] = resolve_deck_name(line["name"])
+        printings, match, matched_name = resolved_names[key]
+
+        if not printings:
+            unresolved.append({
+                "line": line["line_number"],
+                "text": line["line"],
+                "name": line["name"],
+                "quantity": line["quantity"],
+                "section": line["section"],
+            })
+            continue
+
+        card, printing = printing_resolver.resolve(
+            printings,
+            set_code=line["set_code"],
+            collector_number=line["collector_number"],
+        )
+        face_index = matching_face_index(card, matched_name)
+        entry_key = (
+            line["section"],
+            card.get("id") or (card.get("name"), card.get("set"), card.get("collector_number")),
+            face_index,
+            line["finish"],
+        )
+        if entry_key in entries:
+            entries[entry_key]["quantity"] += line["quantity"]
+            continue
+
+        prices = prices_from_card(card, line["finish"]) or {"tcgplayer": 0.0, "ligamagic": 0.0}
+        entries[entry_key] = {
+            "quantity": line["quantity"],
+            "section": line["section"],
+            "finish": line["finish"],
+            "requestedName": line["name"],
+            "match": match,
+            "printing": printing,
+            "card_data": format_card_response(card, prices, face_index),
+        }
+
+    cards = list(entries.values())
+    sections = {}
+    for entry in cards:
+        sections[entry["section"]] = sections.get(entry["section"], 0) + entry["quantity"]
+
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    return {
+        "success": True,
+        "cards": cards,
+        "unresolved": unresolved,
+        "totals": {
+            "cards": sum(entry["quantity"] for entry in cards),
+            "unique_cards": len({entry["card_data"]["name"] for entry in cards}),
+            "sections": sections,
+            "prices": {
+                currency: round(sum(entry["card_data"]["prices"][currency] * entry["quantity"] for entry in cards), 2)
+                for currency in ("tcgplayer", "ligamagic")
+            },
+            "unresolved_lines": len(unresolved),
+            "unresolved_cards": sum(item["quantity"] for item in unresolved),
+        },
+        "processing_info": {
+            "lines": lines,
+            "distinct_names": len(resolved_names),
+            "fuzzy_matches": sum(1 for _, match, _ in resolved_names.values() if match == "fuzzy"),
+            "prices_as_of": card_catalog.prices_as_of,
+            "elapsed_ms": round(elapsed_ms, 2),
+        },
+    }
+
+
+@app.post("/api/lookup")
+async def lookup_deck_list(request: Request):
+    """
+    Preço e dados de uma lista de deck colada (MTGO/Arena), em texto puro no corpo.
+
+    Tudo é resolvido no catálogo local (busca exata com fallback aproximado),
+    sem chamadas à Scryfall; exige o catálogo carregado.
+    """
+    if not card_catalog.loaded:
+        raise HTTPException(
+            status_code=503,
+            detail="Catálogo local não carregado. Rode `python catalog.py` para baixar o bulk data."
+        )
+
+    text = await read_deck_list(request)
+    # Busca aproximada é CPU pura: roda fora do event loop
+    result = await asyncio.to_thread(resolve_deck_list, text)
+
+    info = result["processing_info"]
+    print(f"📋 Lista resolvida: {result['totals']['cards']} cartas, "
+          f"{info['fuzzy_matches']} aproximadas, {result['totals']['unresolved_lines']} não encontradas "
+          f"({info['elapsed_ms']:.1f}ms)")
+    return result
 
 
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0")
-    uvicorn.run(app, host=host, port=port)
+    uvicorn.run(
+        app,
+        host=host,
+        port=port,
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+    )
 
@@ -0,0 +1,227 @@
+"""
+Desambiguação de impressões para Magic Scanner
+Escolhe a impressão correta de uma carta usando código da coleção, número de
+colecionador e comparação do símbolo da coleção com um índice local
+"""
+
+import io
+import json
+import os
+import re
+import time
+from typing import Callable, Optional
+
+from PIL import Image
+
+
+# Região do símbolo da coleção (frações da carta, moldura moderna):
+# à direita da linha de tipo
+SYMBOL_BOX = (0.84, 0.54, 0.95, 0.61)
+
+# Distância de Hamming máxima (de 64 bits) para aceitar o símbolo
+SYMBOL_MAX_DISTANCE = 10
+
+
+def normalize_set_code(set_code: Optional[str]) -> Optional[str]:
+    if not set_code:
+        return None
+    return set_code.strip().lower() or None
+
+
+def normalize_collector_number(number: Optional[str]) -> Optional[str]:
+    """
+    Normaliza o número de colecionador para comparação ('007' -> '7')
+    """
+    if not number:
+        return None
+    number = number.strip().lower().lstrip("0")
+    return number or None
+
+
+def extract_printing_hints(description: str) -> dict:
+    """
+    Extrai código da coleção e número de colecionador lidos pelo Gemini
+    """
+    hints = {"set_code": None, "collector_number": None}
+    if not description:
+        return hints
+
+    set_match = re.search(r"\b(?:SET|COLE[ÇC][ÃA]O)\s*:\s*\(?([A-Za-z0-9]{3,5})\)?\b", description, re.IGNORECASE)
+    if set_match:
+        hints["set_code"] = normalize_set_code(set_match.group(1))
+
+    # Só o campo NÚMERO; o "123/281" do rodapé exige total de 3+ dígitos e
+    # ignora a linha de descrição, onde "2/2" é poder/resistência
+    number_match = re.search(r"N[ÚU]MERO\s*:\s*#?(\d{1,4}[a-z★]?)\b", description, re.IGNORECASE)
+    if not number_match:
+        footer = "\n".join(
+            line for line in description.splitlines()
+            if not re.match(r"\s*DESCRI[ÇC][ÃA]O\s*:", line, re.IGNORECASE)
+        )
+        number_match = re.search(r"\b(\d{1,4}[a-z★]?)\s*/\s*\d{3,4}\b", footer)
+    if number_match:
+        hints["collector_number"] = normalize_collector_number(number_match.group(1))
+
+    return hints
+
+
+def symbol_hash(image: Image.Image) -> int:
+    """
+    dHash de 64 bits da região do símbolo da coleção
+    """
+    width, height = image.size
+    left, top, right, bottom = SYMBOL_BOX
+    crop = image.crop((int(left * width), int(top * height), int(right * width), int(bottom * height)))
+    pixels = list(crop.convert("L").resize((9, 8), Image.Resampling.BILINEAR).getdata())
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def printing_preference(card: dict) -> tuple:
+    """
+    Chave de desempate entre impressões: não digital, com preço em USD, mais recente
+    """
+    prices = card.get("prices") or {}
+    return (
+        not card.get("digital", False),
+        bool(prices.get("usd") or prices.get("usd_foil")),
+        card.get("released_at", ""),
+    )
+
+
+class PrintingResolver:
+    """
+    Estreita as impressões de um nome até a correta
+    """
+
+    def __init__(self):
+        self.symbol_index = {}
+        self.source = None
+
+    def load_symbol_index(self, path: str) -> int:
+        """
+        Carrega o índice código da coleção -> dHash do símbolo
+        """
+        with open(path, "r", encoding="utf-8") as handle:
+            raw = json.load(handle)
+        self.symbol_index = {set_code: int(value, 16) for set_code, value in raw.items()}
+        self.source = path
+        return len(self.symbol_index)
+
+    def resolve(
+        self,
+        printings: list,
+        set_code: Optional[str] = None,
+        collector_number: Optional[str] = None,
+        image_hash: Optional[Callable[[], int]] = None,
+    ) -> tuple:
+        """
+        Retorna (impressão, info). `image_hash` é chamado só se ainda houver
+        empate depois dos filtros de texto; se devolver None o passo do símbolo
+        é pulado e o resultado fica com confiança baixa.
+        """
+        started = time.perf_counter()
+        candidates = list(printings)
+        methods = []
+
+        set_code = normalize_set_code(set_code)
+        if set_code and len(candidates) > 1:
+            by_set = [card for card in candidates if card.get("set") == set_code]
+            if by_set:
+                candidates = by_set
+                methods.append("set_code")
+
+        collector_number = normalize_collector_number(collector_number)
+        if collector_number and len(candidates) > 1:
+            by_number = [
+                card for card in candidates
+                if normalize_collector_number(card.get("collector_number")) == collector_number
+            ]
+            if by_number:
+                candidates = by_number
+                methods.append("collector_number")
+
+        symbol_distance = None
+        symbol_skipped = False
+        if len(candidates) > 1 and image_hash and self.symbol_index:
+            indexed = [card for card in candidates if card.get("set") in self.symbol_index]
+            scanned = image_hash() if indexed else None
+            if indexed and scanned is None:
+                symbol_skipped = True  # Carta não preenche a imagem: recorte do símbolo não é confiável
+            elif indexed:
+                distances = {card.get("set"): hamming(scanned, self.symbol_index[card.get("set")]) for card in indexed}
+                best = min(distances.values())
+                if best <= SYMBOL_MAX_DISTANCE:
+                    candidates = [card for card in indexed if distances[card.get("set")] == best]
+                    symbol_distance = best
+                    methods.append("set_symbol")
+
+        # Empate restante: prefere impressões físicas com preço, depois a mais recente
+        chosen = max(candidates, key=printing_preference) if candidates else None
+        ambiguous = len(candidates) > 1
+
+        return chosen, {
+            "method": "+".join(methods) or ("unique" if len(printings) == 1 else "default"),
+            "candidates": len(printings),
+            "remaining": len(candidates),
+            "symbol_distance": symbol_distance,
+            "symbol_skipped": symbol_skipped,
+            "ambiguous": ambiguous,
+            "confidence": "low" if ambiguous else "high",
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def info(self) -> dict:
+        return {"source": self.source, "sets": len(self.symbol_index)}
+
+
+def build_symbol_index(catalog_path: str, dest: str) -> int:
+    """
+    Monta o índice de símbolos baixando uma imagem pequena por coleção do
+    catálogo e aplicando o mesmo recorte usado nos scans (uso offline)
+    """
+    import httpx
+
+    with open(catalog_path, "r", encoding="utf-8") as handle:
+        cards = json.load(handle)
+
+    image_by_set = {}
+    for card in cards:
+        set_code = card.get("set")
+        url = card.get("image_uris", {}).get("normal")
+        if set_code and url and set_code not in image_by_set and card.get("layout") == "normal":
+            image_by_set[set_code] = url
+
+    index = {}
+    with httpx.Client(timeout=30) as client:
+        for set_code, url in image_by_set.items():
+            try:
+                response = client.get(url)
+                response.raise_for_status()
+                image = Image.open(io.BytesIO(response.content)).convert("RGB")
+                index[set_code] = format(symbol_hash(image), "016x")
+                time.sleep(0.1)  # Respeita o rate limit da Scryfall
+            except Exception as e:
+                print(f"⚠️  {set_code}: {e}")
+
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    with open(dest, "w", encoding="utf-8") as handle:
+        json.dump(index, handle)
+    return len(index)
+
+
+if __name__ == "__main__":
+    import sys
+
+    catalog_file = sys.argv[1] if len(sys.argv) > 1 else os.getenv("CATALOG_PATH", "data/cards.json")
+    target = sys.argv[2] if len(sys.argv) > 2 else os.getenv("SYMBOL_INDEX_PATH", "data/set_symbols.json")
+    print(f"🔣 Montando índice de símbolos de {catalog_file} em {target}...")
+    print(f"✅ {build_symbol_index(catalog_file, target)} coleções indexadas")
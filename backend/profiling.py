@@ -0,0 +1,168 @@
+"""
+Profiling do Magic Scanner
+Perfil opcional por requisição, tempos das chamadas externas e captura dos
+scans lentos num ring buffer em disco
+"""
+
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import uuid
+from typing import Optional
+
+try:
+    from pyinstrument import Profiler as PyinstrumentProfiler
+except ImportError:
+    PyinstrumentProfiler = None  # Usa cProfile da biblioteca padrão
+
+
+# Trace do scan em andamento (tempos de estágios e chamadas externas)
+current_trace = contextvars.ContextVar("scan_trace", default=None)
+
+
+def update_trace(**fields):
+    """
+    Anexa informações ao trace do scan atual (no-op fora de um scan)
+    """
+    trace = current_trace.get()
+    if trace is not None:
+        trace.update(fields)
+
+
+def record_upstream(service: str, operation: str, elapsed_ms: float, status=None):
+    """
+    Registra o tempo de uma chamada externa (Gemini, Scryfall) no trace atual
+    """
+    trace = current_trace.get()
+    if trace is not None:
+        trace["upstream"].append({
+            "service": service,
+            "operation": operation,
+            "ms": round(elapsed_ms, 1),
+            "status": status,
+        })
+
+
+class ScanProfiler:
+    """
+    Perfil de um scan: pyinstrument (modo async) se instalado, senão cProfile.
+
+    Só um perfil roda por vez; com cProfile o relatório inclui o que mais
+    estiver rodando no event loop no mesmo intervalo. Perfis de fundo (todo
+    scan, para pegar os lentos) cedem a vez: um perfil pedido ou amostrado
+    interrompe o de fundo, e um de fundo não começa sobre um pedido.
+    """
+
+    active = None
+    # pyinstrument amostra a pilha (custo baixo o bastante para rodar em todo scan);
+    # cProfile instrumenta cada chamada e só roda quando pedido ou amostrado
+    sampling = PyinstrumentProfiler is not None
+
+    def __init__(self, background: bool = False):
+        self.engine = "pyinstrument" if PyinstrumentProfiler else "cprofile"
+        self.background = background
+        self.skipped = None  # "busy" ou "preempted" quando o scan ficou sem relatório
+        self._profiler = None
+
+    def start(self) -> bool:
+        current = ScanProfiler.active
+        if current is not None:
+            if self.background or not current.background:
+                self.skipped = "busy"
+                return False
+            current._halt()
+            current.skipped = "preempted"
+
+        if PyinstrumentProfiler:
+            self._profiler = PyinstrumentProfiler(async_mode="enabled")
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        ScanProfiler.active = self
+        return True
+
+    def _halt(self):
+        if PyinstrumentProfiler:
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+        self._profiler = None
+        ScanProfiler.active = None
+
+    def stop(self) -> Optional[str]:
+        """
+        Para o perfil e devolve o relatório em texto (None se não rodou)
+        """
+        if self._profiler is None:
+            return None
+        profiler = self._profiler
+        self._halt()
+        if PyinstrumentProfiler:
+            return profiler.output_text(unicode=True, color=False)
+
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(40)
+        return output.getvalue()
+
+
+class ProfileStore:
+    """
+    Ring buffer em disco: um JSON por captura, apagando as mais antigas
+    """
+
+    def __init__(self, directory: str, capacity: int = 50):
+        self.directory = directory
+        self.capacity = max(1, capacity)
+
+    def _files(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+
+    def save(self, entry: dict) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        # Nanossegundos no id: a ordem dos arquivos é a ordem de gravação
+        now_ns = time.time_ns()
+        now = time.localtime(now_ns // 1_000_000_000)
+        capture_id = f"{time.strftime('%Y%m%d-%H%M%S', now)}-{now_ns % 1_000_000_000:09d}-{uuid.uuid4().hex[:6]}"
+        entry = {"id": capture_id, "captured_at": time.strftime("%Y-%m-%dT%H:%M:%S", now), **entry}
+
+        path = os.path.join(self.directory, f"{capture_id}.json")
+        with open(path, "w", encoding="utf-8") as handle:
+            json.dump(entry, handle, ensure_ascii=False, default=str)
+
+        for name in self._files()[:-self.capacity]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass  # Outro save() concorrente já apagou
+        return capture_id
+
+    def list(self) -> list:
+        """
+        Resumo das capturas, da mais recente para a mais antiga
+        """
+        summaries = []
+        for name in reversed(self._files()):
+            entry = self.get(name[:-len(".json")])
+            if entry:
+                summaries.append({
+                    key: entry.get(key)
+                    for key in ("id", "captured_at", "reason", "total_ms", "card_name", "error")
+                } | {"has_profile": bool(entry.get("profile"))})
+        return summaries
+
+    def get(self, capture_id: str) -> Optional[dict]:
+        # Só aceita ids gerados por save() (evita path traversal)
+        if not capture_id.replace("-", "").isalnum():
+            return None
+        path = os.path.join(self.directory, f"{capture_id}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as handle:
+            return json.load(handle)
@@ -0,0 +1,189 @@
+"""
+Escalonador de reconhecimento para Magic Scanner
+Fila com prioridades (interativo / lote) e rodízio justo entre clientes
+na frente da cota única do Gemini
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Awaitable, Callable, Optional
+
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BATCH = "batch"
+PRIORITIES = (PRIORITY_INTERACTIVE, PRIORITY_BATCH)
+
+
+class SchedulerOverloaded(Exception):
+    """
+    Requisição recusada pelo controle de admissão (vira HTTP 429)
+    """
+
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+
+
+class RecognitionScheduler:
+    """
+    Limita as chamadas simultâneas ao reconhecedor e decide quem entra primeiro.
+
+    - Classes de prioridade: `interactive` sempre na frente de `batch`, mas a
+      cada `batch_share` liberações um item de lote passa, para não morrer de fome.
+    - Dentro de cada classe, os clientes são atendidos em rodízio (um item por
+      cliente por vez), então uma importação em massa não bloqueia os demais.
+    - Controle de admissão: se a fila estiver cheia ou a espera estimada passar
+      de `max_wait_seconds`, recusa na hora com uma estimativa de Retry-After.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 4,
+        max_queue_depth: Optional[dict] = None,
+        max_wait_seconds: float = 60.0,
+        batch_share: int = 4,
+        initial_service_seconds: float = 5.0,
+    ):
+        self.concurrency = max(1, concurrency)
+        self.max_queue_depth = max_queue_depth or {PRIORITY_INTERACTIVE: 32, PRIORITY_BATCH: 256}
+        self.max_wait_seconds = max_wait_seconds
+        self.batch_share = max(1, batch_share)
+        self.avg_service_seconds = initial_service_seconds
+
+        self._running = 0
+        self._grants_since_batch = 0
+        self._queues = {priority: OrderedDict() for priority in PRIORITIES}
+        self._depth = {priority: 0 for priority in PRIORITIES}
+        self.stats = {"admitted": 0, "rejected": 0, "completed": 0}
+
+    def estimate_wait(self, priority: str) -> float:
+        """
+        Espera estimada (segundos) para uma nova requisição nesta classe
+        """
+        if priority == PRIORITY_INTERACTIVE:
+            ahead = self._depth[PRIORITY_INTERACTIVE]
+        else:
+            ahead = self._depth[PRIORITY_INTERACTIVE] + self._depth[PRIORITY_BATCH]
+
+        if self._running < self.concurrency and ahead == 0:
+            return 0.0
+        return (ahead + 1) * self.avg_service_seconds / self.concurrency
+
+    def _admit(self, priority: str):
+        if self._depth[priority] >= self.max_queue_depth[priority]:
+            self.stats["rejected"] += 1
+            raise SchedulerOverloaded(self.estimate_wait(priority), "Fila de reconhecimento cheia")
+
+        estimated = self.estimate_wait(priority)
+        if estimated > self.max_wait_seconds:
+            self.stats["rejected"] += 1
+            raise SchedulerOverloaded(estimated, "Espera estimada acima do limite")
+
+        self.stats["admitted"] += 1
+
+    def _enqueue(self, client_id: str, priority: str) -> asyncio.Future:
+        ticket = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(client_id, deque()).append(ticket)
+        self._depth[priority] += 1
+        return ticket
+
+    def _discard(self, client_id: str, priority: str, ticket: asyncio.Future):
+        tickets = self._queues[priority].get(client_id)
+        if tickets and ticket in tickets:
+            tickets.remove(ticket)
+            self._depth[priority] -= 1
+            if not tickets:
+                del self._queues[priority][client_id]
+
+    def _pop_next(self) -> Optional[asyncio.Future]:
+        """
+        Próximo ticket: prioridade interativa com cota para lote, rodízio entre clientes
+        """
+        order = [PRIORITY_INTERACTIVE, PRIORITY_BATCH]
+        if self._grants_since_batch >= self.batch_share:
+            order.reverse()
+
+        for priority in order:
+            queue = self._queues[priority]
+            if not queue:
+                continue
+
+            client_id, tickets = next(iter(queue.items()))
+            ticket = tickets.popleft()
+            self._depth[priority] -= 1
+            del queue[client_id]
+            if tickets:
+                queue[client_id] = tickets  # Volta para o fim do rodízio
+
+            if priority == PRIORITY_BATCH:
+                self._grants_since_batch = 0
+            else:
+                self._grants_since_batch += 1
+            return ticket
+        return None
+
+    def _release(self):
+        self._running -= 1
+        while self._running < self.concurrency:
+            ticket = self._pop_next()
+            if ticket is None:
+                break
+            if ticket.done():
+                continue  # Cliente desistiu enquanto esperava
+            self._running += 1
+            ticket.set_result(True)
+
+    async def run(self, client_id: str, priority: str, func: Callable[..., Awaitable], *args, **kwargs):
+        """
+        Executa `func` quando houver vaga, respeitando prioridade e rodízio
+        """
+        if priority not in PRIORITIES:
+            priority = PRIORITY_INTERACTIVE
+
+        self._admit(priority)
+
+        if self._running < self.concurrency and not any(self._depth.values()):
+            self._running += 1
+        else:
+            ticket = self._enqueue(client_id, priority)
+            try:
+                await asyncio.wait_for(asyncio.shield(ticket), timeout=self.max_wait_seconds)
+            except asyncio.TimeoutError:
+                self._discard(client_id, priority, ticket)
+                if ticket.done() and not ticket.cancelled():
+                    self._release()  # Vaga liberada no mesmo instante do timeout
+                self.stats["rejected"] += 1
+                raise SchedulerOverloaded(self.estimate_wait(priority), "Tempo de espera na fila esgotado")
+            except asyncio.CancelledError:
+                self._discard(client_id, priority, ticket)
+                if ticket.done() and not ticket.cancelled():
+                    self._release()
+                else:
+                    ticket.cancel()
+                raise
+
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.avg_service_seconds = 0.8 * self.avg_service_seconds + 0.2 * elapsed
+            self.stats["completed"] += 1
+            self._release()
+
+    def snapshot(self) -> dict:
+        """
+        Estado atual das filas, para diagnóstico
+        """
+        return {
+            "running": self._running,
+            "concurrency": self.concurrency,
+            "queued": dict(self._depth),
+            "clients_waiting": {priority: len(queue) for priority, queue in self._queues.items()},
+            "avg_service_seconds": round(self.avg_service_seconds, 2),
+            "estimated_wait_seconds": {priority: round(self.estimate_wait(priority), 1) for priority in PRIORITIES},
+            **self.stats,
+        }
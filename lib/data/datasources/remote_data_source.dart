@@ -1,5 +1,7 @@
 import 'dart:io';
+import 'dart:math';
 import 'package:dio/dio.dart';
+import 'package:path_provider/path_provider.dart';
 import '../../domain/models/card_model.dart';
 import '../../core/constants/app_constants.dart';
 
@@ -19,6 +21,35 @@ class RemoteDataSource {
               ),
             );
 
+  String? _clientId;
+
+  /// Id estável desta instalação, enviado em `X-Client-Id` para o rodízio
+  /// justo da fila de reconhecimento do backend
+  Future<String> _getClientId() async {
+    if (_clientId != null) return _clientId!;
+
+    final random = Random.secure();
+    final generated = List.generate(
+      16,
+      (_) => random.nextInt(256).toRadixString(16).padLeft(2, '0'),
+    ).join();
+
+    try {
+      final directory = await getApplicationSupportDirectory();
+      final file = File('${directory.path}/client_id');
+      if (await file.exists()) {
+        final stored = (await file.readAsString()).trim();
+        if (stored.isNotEmpty) return _clientId = stored;
+      }
+      await file.create(recursive: true);
+      await file.writeAsString(generated);
+    } catch (e) {
+      // Sem armazenamento: o id vale só para esta sessão
+      print('⚠️ Não foi possível salvar o id do cliente: $e');
+    }
+    return _clientId = generated;
+  }
+
   /// Envia uma imagem para o backend e recebe a descrição, nome e dados completos (se houver)
   Future<Map<String, dynamic>> scanCard(String imagePath) async {
     // Tenta até 2 vezes em caso de timeout
@@ -59,6 +90,7 @@ class RemoteDataSource {
           options: Options(
             headers: {
               'Content-Type': 'multipart/form-data',
+              'X-Client-Id': await _getClientId(),
             },
             // Timeout específico para esta requisição
             receiveTimeout: Duration(minutes: attempt == 1 ? 3 : 5),